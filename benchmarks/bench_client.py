@@ -0,0 +1,157 @@
+"""
+End-to-end benchmark of the synchronous client.
+
+Runs the public client against a WS66iEmulator on a local port and
+measures the latency of zone_status and every setter, the time to refresh
+6, 12 and 18 zones, the time restore_zone takes and the throughput of
+several threads sharing one client. The results are printed and written
+to a JSON file that can be compared between releases.
+
+    PYTHONPATH=. python benchmarks/bench_client.py --output bench_client.json
+"""
+import argparse
+import json
+import platform
+import threading
+import time
+
+from pyws66i import ZoneStatus, get_ws66i, WS66iEmulator
+from pyws66i.codec import ZONES
+
+SETTERS = (
+    ("set_power", True),
+    ("set_mute", False),
+    ("set_volume", 20),
+    ("set_treble", 7),
+    ("set_bass", 7),
+    ("set_balance", 10),
+    ("set_source", 2),
+)
+
+
+def percentile(samples, percent: float) -> float:
+    """
+    :return: nearest-rank percentile of samples
+    """
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(percent / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """
+    :param samples: durations in seconds
+    :return: dict of p50 and p99 in milliseconds
+    """
+    return {
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "samples": len(samples),
+    }
+
+
+def measure(func, iterations: int):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def bench_zone_status(ws66i, iterations: int):
+    return measure(lambda: ws66i.zone_status(11), iterations)
+
+
+def bench_setters(ws66i, iterations: int):
+    return {
+        name: measure(lambda: getattr(ws66i, name)(12, value), iterations) for name, value in SETTERS
+    }
+
+
+def bench_refresh(ws66i, iterations: int):
+    return {
+        "{}_zones".format(count): measure(lambda: ws66i.zone_statuses(ZONES[:count]), iterations)
+        for count in (6, 12, 18)
+    }
+
+
+def bench_restore_zone(ws66i, iterations: int):
+    # Every attribute differs, so every restore sends all of them
+    statuses = (
+        ZoneStatus(13, 0, 1, 0, 0, 10, 3, 3, 5, 2, 1),
+        ZoneStatus(13, 0, 0, 1, 0, 30, 11, 11, 15, 5, 1),
+    )
+    samples = []
+    for index in range(iterations):
+        start = time.perf_counter()
+        ws66i.restore_zone(statuses[index % 2])
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def bench_throughput(ws66i, threads: int, duration: float):
+    """
+    :return: number of zone_status calls per second all threads made
+    together
+    """
+    counts = [0] * threads
+    stop = threading.Event()
+
+    def worker(index: int):
+        zone = ZONES[index % 6]
+        while not stop.is_set():
+            ws66i.zone_status(zone)
+            counts[index] += 1
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    for thread in workers:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in workers:
+        thread.join()
+    return round(sum(counts) / duration, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200, help="samples per measurement")
+    parser.add_argument("--threads", type=int, default=8, help="maximum number of caller threads")
+    parser.add_argument("--duration", type=float, default=2.0, help="seconds per throughput run")
+    parser.add_argument("--latency", type=float, default=0.0, help="emulated reply latency in seconds")
+    parser.add_argument("--output", default="bench_client.json", help="JSON file the results are written to")
+    args = parser.parse_args()
+
+    with WS66iEmulator(controllers=(1, 2, 3), latency=args.latency) as emulator:
+        ws66i = get_ws66i(emulator.host_name, emulator.host_port)
+        ws66i.open()
+        try:
+            results = {
+                "zone_status": bench_zone_status(ws66i, args.iterations),
+                "setters": bench_setters(ws66i, args.iterations),
+                "refresh": bench_refresh(ws66i, args.iterations),
+                "restore_zone": bench_restore_zone(ws66i, args.iterations),
+                "throughput_ops_per_s": {
+                    str(threads): bench_throughput(ws66i, threads, args.duration)
+                    for threads in sorted({1, 2, 4, args.threads})
+                    if threads <= args.threads
+                },
+            }
+        finally:
+            ws66i.close()
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "iterations": args.iterations,
+        "latency_s": args.latency,
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
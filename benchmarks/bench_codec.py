@@ -0,0 +1,49 @@
+"""
+Micro-benchmark of the protocol codec.
+
+Compares encoding set commands and parsing zone status replies with the
+codec against the string formatting and per-call regex the client used
+before, and prints the throughput of each in operations per second.
+
+    PYTHONPATH=. python benchmarks/bench_codec.py
+"""
+import re
+import timeit
+
+from pyws66i import ZoneStatus, codec
+
+LINE = b"#>1100010000131112100401\r\r\n"
+NUMBER = 200000
+
+
+def legacy_encode():
+    volume = int(max(0, min(13, 38)))
+    return "<{}VO{:02}\r".format(11, volume).encode()
+
+
+def codec_encode():
+    return codec.format_set_volume(11, 13)
+
+
+def legacy_parse():
+    expect_str = f"({11})(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)"
+    match = re.search(expect_str.encode(), LINE)
+    return [int(m) for m in match.groups()]
+
+
+def codec_parse():
+    return codec.parse_zone_status_line(LINE)
+
+
+def codec_parse_zone_status():
+    return ZoneStatus.from_line(LINE)
+
+
+def main():
+    for func in (legacy_encode, codec_encode, legacy_parse, codec_parse, codec_parse_zone_status):
+        seconds = min(timeit.repeat(func, number=NUMBER, repeat=3))
+        print("{:<26} {:>12,.0f} ops/s".format(func.__name__, NUMBER / seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,68 @@
+import asyncio
 import logging
-from telnetlib import Telnet
+import queue
+import time
+import weakref
+from collections import deque, namedtuple
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
 import socket
 from functools import wraps
 
-from threading import RLock
+from threading import Condition, Event, Lock, Thread, Timer, current_thread, local
+
+from .codec import (
+    CONTROLLERS,
+    ZONE_STATUS_FIELDS,
+    controller_zones,
+    decode_set_commands,
+    decode_zone_status,
+    encode_zone_status,
+    format_controller_status_request,
+    format_set_balance,
+    format_set_bass,
+    format_set_mute,
+    format_set_power,
+    format_set_source,
+    format_set_treble,
+    format_set_volume,
+    format_zone_status_request,
+    parse_zone_status_line,
+    zone_pattern,
+)
+from .breaker import CircuitBreaker, STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN
+from .emulator import WS66iEmulator
+from .group import AsyncZoneGroup, ZoneGroup
+from .metrics import Metrics, command_name
+from .poller import AdaptivePoller
+from .rtt import RttEstimator
+from .transport import RECEIVED, SENT, SocketTransport, TelnetTransport, Transport
 
 _LOGGER = logging.getLogger(__name__)
 
-TIMEOUT = 0.8  # Number of seconds before telnet operation timeout
+TIMEOUT = 0.8  # Number of seconds before telnet operation timeout, unless adaptive
+LISTEN_INTERVAL = 0.2  # Number of seconds the listener blocks on a read
+FADE_INTERVAL = 0.1  # Number of seconds between volume steps of a fade
 
+# Priorities of the calls queued for the I/O worker, highest first
+PRIORITY_INTERACTIVE = "interactive"  # Setters and other calls a user waits for
+PRIORITY_BACKGROUND = "background"  # Status requests, usually polling
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND)
+STARVATION_LIMIT = 8  # Number of calls taken in a row before the oldest waiting call goes next
 
-class ZoneStatus(object):
-    def __init__(
-        self,
+
+class ZoneStatus(namedtuple("ZoneStatus", ZONE_STATUS_FIELDS)):
+    """
+    Immutable status of a zone. Being a tuple it has no per-instance
+    __dict__, compares and hashes by value and can be used as a dict key.
+    Use _replace(field=value) to derive a modified status.
+    """
+
+    __slots__ = ()
+
+    def __new__(
+        cls,
         zone: int, # (11 - 16)
         pa: bool,
         power: bool,
@@ -25,19 +75,30 @@ class ZoneStatus(object):
         source: int, # (1 - 6)
         keypad: bool,
     ):
-        self.zone = zone
-        self.pa = bool(pa)
-        self.power = bool(power)
-        self.mute = bool(mute)
-        self.do_not_disturb = bool(do_not_disturb)
-        self.volume = volume
-        self.treble = treble
-        self.bass = bass
-        self.balance = balance
-        self.source = source
-        self.keypad = bool(keypad)
-
-        str(self)
+        return super().__new__(
+            cls,
+            zone,
+            bool(pa),
+            bool(power),
+            bool(mute),
+            bool(do_not_disturb),
+            volume,
+            treble,
+            bass,
+            balance,
+            source,
+            bool(keypad),
+        )
+
+    def diff(self, other):
+        """
+        :param other: status to compare against
+        :return: dict of the fields whose value differs in other, mapped to
+        the value in other
+        """
+        return {
+            field: theirs for field, mine, theirs in zip(self._fields, self, other) if mine != theirs
+        }
 
     def __str__(self):
         return f"""
@@ -58,7 +119,183 @@ class ZoneStatus(object):
     def from_string(cls, match):
         if not match:
             return None
-        return ZoneStatus(*[int(m) for m in match.groups()])
+        return cls.from_bytes(match.group(0))
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        :param data: the 22 digits of a zone status, i.e. b"1100010000131112100401"
+        :return: ZoneStatus or None if data isn't a zone status
+        """
+        fields = decode_zone_status(data)
+        if fields is None:
+            return None
+        return cls(*fields)
+
+    def to_bytes(self) -> bytes:
+        """
+        :return: the 22 digits of the zone status, the reverse of from_bytes
+        """
+        return encode_zone_status(self)
+
+    @classmethod
+    def from_line(cls, line):
+        """
+        :param line: line received from the WS66i, i.e. b"#>1100010000131112100401\\r\\r\\n"
+        :return: ZoneStatus or None if the line isn't a zone status
+        """
+        fields = parse_zone_status_line(line)
+        if fields is None:
+            return None
+        return cls(*fields)
+
+
+class _ZoneStatusCache(object):
+    """
+    Write-through cache of zone statuses. An entry is fresh for ttl seconds
+    after it was last received from the WS66i. Commands sent to the WS66i
+    update the cached fields without refreshing the entry.
+    """
+
+    def __init__(self, ttl: float):
+        self._ttl = ttl
+        self._lock = Lock()
+        self._entries = {}
+
+    def get(self, zone: int):
+        """
+        :param zone: zone 11..16, 21..26, 31..36
+        :return: cached status of the zone or None if missing or stale
+        """
+        with self._lock:
+            entry = self._entries.get(zone)
+            if entry is None or time.monotonic() - entry[1] > self._ttl:
+                return None
+            return entry[0]
+
+    def put(self, status: ZoneStatus):
+        with self._lock:
+            self._entries[status.zone] = (status, time.monotonic())
+
+    def apply(self, request: bytes):
+        """
+        Update the cached status of zones with the values of set commands
+        :param request: set commands sent to the WS66i, i.e. b"<11VO20\\r<11MU01\\r"
+        """
+        with self._lock:
+            for zone, field, value in decode_set_commands(request):
+                entry = self._entries.get(zone)
+                if entry is not None:
+                    value = bool(value) if field in ("power", "mute") else value
+                    self._entries[zone] = (entry[0]._replace(**{field: value}), entry[1])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class _AsyncBatch(object):
+    """
+    Batch of an asyncio client. Tasks created inside the batch inherit it
+    with their context, so it records the task that owns it and whether it
+    is still collecting.
+    """
+
+    def __init__(self, client, task, outer):
+        self.client = client
+        self.task = task
+        self.open = True
+        # Set commands keyed by zone and attribute, i.e. b"11VO"
+        self.commands = {}
+        # Batch this one is nested in, i.e. of another client
+        self.outer = outer
+
+    @staticmethod
+    def find(client):
+        """
+        :return: batch collecting the set commands client sends from the
+        current task, None to send them right away
+        """
+        batch = _async_batch.get()
+        task = asyncio.current_task()
+        while batch is not None:
+            if batch.client is client:
+                return batch if batch.open and batch.task is task else None
+            batch = batch.outer
+        return None
+
+
+# Innermost batch of the asyncio clients in the current context
+_async_batch = ContextVar("ws66i_async_batch", default=None)
+
+
+class _VolumeFade(object):
+    """
+    Linear volume ramp of a single zone. Fades started by the same call
+    share a done event that is set once all of them are finished.
+    """
+
+    def __init__(self, start: int, target: int, duration: float, group: list, done: Event):
+        self.start = start
+        self.target = target
+        self.start_time = time.monotonic()
+        self.end_time = self.start_time + duration
+        self.sent = start
+        self._group = group
+        self._done = done
+
+    def volume_at(self, now: float) -> int:
+        if now >= self.end_time:
+            return self.target
+        progress = (now - self.start_time) / (self.end_time - self.start_time)
+        return int(round(self.start + (self.target - self.start) * progress))
+
+    def finish(self):
+        self._group.remove(self)
+        if not self._group:
+            self._done.set()
+
+
+class _CallQueue(object):
+    """
+    Queue of the calls of the I/O worker. Calls are taken by priority and
+    in order within a priority. When STARVATION_LIMIT calls in a row were
+    taken while a lower priority call was waiting, the oldest waiting call
+    goes next, so polling still runs while setters keep coming.
+    """
+
+    def __init__(self):
+        self._cond = Condition()
+        self._calls = {priority: deque() for priority in PRIORITIES}
+        self._sequence = 0
+        self._skipped = 0
+
+    def put(self, priority: str, call):
+        with self._cond:
+            self._calls[priority].append((self._sequence, call))
+            self._sequence += 1
+            self._cond.notify()
+
+    def get(self):
+        """
+        Block until a call is queued
+        :return: priority and call
+        """
+        with self._cond:
+            waiting = [priority for priority in PRIORITIES if self._calls[priority]]
+            while not waiting:
+                self._cond.wait()
+                waiting = [priority for priority in PRIORITIES if self._calls[priority]]
+
+            priority = waiting[0]
+            if len(waiting) == 1:
+                self._skipped = 0
+            elif self._skipped < STARVATION_LIMIT:
+                self._skipped += 1
+            else:
+                priority = min(waiting, key=lambda waiting_priority: self._calls[waiting_priority][0][0])
+                self._skipped = 0
+            return priority, self._calls[priority].popleft()[1]
 
 
 class WS66i(object):
@@ -68,259 +305,1588 @@ class WS66i(object):
 
     def open(self):
         """
-        Open a connection to the Telnet server. Must be the first call.
+        Open a connection to the WS66i. Must be the first call.
         """
         raise NotImplementedError
 
     def close(self):
         """
-        Close the connection to the Telnet server. Open() will need to be
+        Close the connection to the WS66i. Open() will need to be
         called again to communicate with the server.
         """
         raise NotImplementedError
 
-    def zone_status(self, zone: int):
+    def zone_status(self, zone: int, timeout=None):
         """
         Get the structure representing the status of the zone
         :param zone: zone 11..16, 21..26, 31..36
+        :param timeout: number of seconds to wait for the reply. None uses
+        the timeout of the client.
         :return: status of the zone or None. If None is returned
         then an error was occured. This is most likely due to the
         amp being turned off. It will attempt to re-establish a
-        connection if a connection was previously present.
+        connection if a connection was previously present. None is
+        also returned for zones of controllers the topology doesn't list.
         """
         raise NotImplementedError
 
-    def set_power(self, zone: int, power: bool):
+    def controller_status(self, controller: int, timeout=None):
+        """
+        Get the structures representing the status of every zone of a
+        controller using a single request
+        :param controller: 1 for the main amp, 2..3 for expanders
+        :param timeout: number of seconds to wait for each reply, just like zone_status
+        :return: list of the six zone statuses of the controller or None.
+        If None is returned then an error was occured, just like zone_status.
+        """
+        raise NotImplementedError
+
+    def zone_statuses(self, zones, timeout=None):
+        """
+        Get the structures representing the status of several zones. All
+        requests are sent in a single write and the replies are matched to
+        their zones, so the zones cost one round trip instead of one each.
+        :param zones: list of zones 11..16, 21..26, 31..36
+        :param timeout: number of seconds to wait for each reply, just like zone_status
+        :return: list of statuses in the order of zones or None. If None is
+        returned then an error was occured, just like zone_status. Zones of
+        controllers the topology doesn't list are left out.
+        """
+        raise NotImplementedError
+
+    def probe_topology(self, timeout=None):
+        """
+        Find out which controllers are connected by requesting the status
+        of each of them once. The result is kept by the client, status
+        requests for zones of other controllers then return right away
+        without asking the WS66i.
+        :param timeout: number of seconds to wait for each controller. None
+        uses the timeout of the client.
+        :return: list of connected controllers, i.e. [1, 2], or None if the
+        main amp did not reply
+        """
+        raise NotImplementedError
+
+    def topology(self):
+        """
+        :return: list of connected controllers found by probe_topology or
+        passed when the client was created, None if unknown. It can be
+        stored and passed as topology when the client is created again.
+        """
+        raise NotImplementedError
+
+    def set_power(self, zone: int, power: bool, timeout=None):
         """
         Turn zone on or off
         :param zone: zone 11..16, 21..26, 31..36
         :param power: True to turn on, False to turn off
+        :param timeout: number of seconds to wait for the connection to be free
+        to send the command. None waits as long as it takes.
         """
         raise NotImplementedError
 
-    def set_mute(self, zone: int, mute: bool):
+    def set_mute(self, zone: int, mute: bool, timeout=None):
         """
         Mute zone on or off
         :param zone: zone 11..16, 21..26, 31..36
         :param mute: True to mute, False to unmute
+        :param timeout: number of seconds to wait for the connection to be free
+        to send the command. None waits as long as it takes.
         """
         raise NotImplementedError
 
-    def set_volume(self, zone: int, volume: int):
+    def set_volume(self, zone: int, volume: int, timeout=None):
         """
         Set volume for zone
         :param zone: zone 11..16, 21..26, 31..36
         :param volume: integer from 0 to 38 inclusive
+        :param timeout: number of seconds to wait for the connection to be free
+        to send the command. None waits as long as it takes.
         """
         raise NotImplementedError
 
-    def set_treble(self, zone: int, treble: int):
+    def set_treble(self, zone: int, treble: int, timeout=None):
         """
         Set treble for zone
         :param zone: zone 11..16, 21..26, 31..36
         :param treble: integer from 0 to 14 inclusive, where 0 is -7 treble and 14 is +7
+        :param timeout: number of seconds to wait for the connection to be free
+        to send the command. None waits as long as it takes.
         """
         raise NotImplementedError
 
-    def set_bass(self, zone: int, bass: int):
+    def set_bass(self, zone: int, bass: int, timeout=None):
         """
         Set bass for zone
         :param zone: zone 11..16, 21..26, 31..36
         :param bass: integer from 0 to 14 inclusive, where 0 is -7 bass and 14 is +7
+        :param timeout: number of seconds to wait for the connection to be free
+        to send the command. None waits as long as it takes.
         """
         raise NotImplementedError
 
-    def set_balance(self, zone: int, balance: int):
+    def set_balance(self, zone: int, balance: int, timeout=None):
         """
         Set balance for zone
         :param zone: zone 11..16, 21..26, 31..36
         :param balance: integer from 0 to 20 inclusive, where 0 is -10(left), 0 is center and 20 is +10 (right)
+        :param timeout: number of seconds to wait for the connection to be free
+        to send the command. None waits as long as it takes.
         """
         raise NotImplementedError
 
-    def set_source(self, zone: int, source: int):
+    def set_source(self, zone: int, source: int, timeout=None):
         """
         Set source for zone
         :param zone: zone 11..16, 21..26, 31..36
         :param source: integer from 0 to 6 inclusive
+        :param timeout: number of seconds to wait for the connection to be free
+        to send the command. None waits as long as it takes.
         """
         raise NotImplementedError
 
     def restore_zone(self, status: ZoneStatus):
         """
-        Restores zone to it's previous state
+        Restores zone to it's previous state. The current state of the zone
+        is compared against the given state and only the attributes that
+        differ are sent, in a single write. Nothing is sent if the current
+        state of the zone can't be read.
         :param status: zone state to restore
         """
         raise NotImplementedError
 
+    def capture_scene(self, name: str, zones, timeout=None):
+        """
+        Take a snapshot of several zones that can be applied later
+        :param name: name of the scene
+        :param zones: list of zones 11..16, 21..26, 31..36
+        :param timeout: number of seconds to wait for each reply, just like zone_status
+        :return: Scene with the status of the zones or None. If None is
+        returned then an error was occured, just like zone_statuses.
+        """
+        raise NotImplementedError
 
-# Helpers
-
-
-def _format_zone_status_request(zone: int) -> bytes:
-    return "?{}\r".format(zone).encode()
-
-
-def _format_set_power(zone: int, power: bool) -> bytes:
-    return "<{}PR{}\r".format(zone, "01" if power else "00").encode()
-
-
-def _format_set_mute(zone: int, mute: bool) -> bytes:
-    return "<{}MU{}\r".format(zone, "01" if mute else "00").encode()
-
-
-def _format_set_volume(zone: int, volume: int) -> bytes:
-    volume = int(max(0, min(volume, 38)))
-    return "<{}VO{:02}\r".format(zone, volume).encode()
+    def apply_scene(self, scene):
+        """
+        Bring the zones of a scene back to their captured state. The current
+        state of every zone is requested in a single write, then only the
+        attributes that differ are sent, all zones in a single write.
+        Nothing is sent if the current state of the zones can't be read.
+        :param scene: Scene returned by capture_scene or loaded from a SceneStore
+        """
+        raise NotImplementedError
 
+    def batch(self):
+        """
+        Context manager collecting the set_* calls made inside it, use
+        "async with" for the asyncio client. Only the last value for each
+        zone and attribute is kept and everything is sent in a single write
+        when the block ends, or nothing if it raises. Calls of other
+        threads or tasks are not collected.
+        """
+        raise NotImplementedError
 
-def _format_set_treble(zone: int, treble: int) -> bytes:
-    treble = int(max(0, min(treble, 14)))
-    return "<{}TR{:02}\r".format(zone, treble).encode()
+    def subscribe(self, callback):
+        """
+        Register a callback for zone status updates. While at least one
+        callback is registered and the connection is open, a background
+        reader owns the connection and delivers every zone status sent by
+        the WS66i to the callbacks, including the unsolicited updates sent
+        when a keypad changes a zone.
+        :param callback: callable that takes a ZoneStatus
+        """
+        raise NotImplementedError
 
+    def unsubscribe(self, callback):
+        """
+        Remove a callback registered with subscribe. The background reader
+        stops when no callbacks are left.
+        :param callback: callable previously passed to subscribe
+        """
+        raise NotImplementedError
 
-def _format_set_bass(zone: int, bass: int) -> bytes:
-    bass = int(max(0, min(bass, 14)))
-    return "<{}BS{:02}\r".format(zone, bass).encode()
 
+# Helpers
 
-def _format_set_balance(zone: int, balance: int) -> bytes:
-    balance = max(0, min(balance, 20))
-    return "<{}BL{:02}\r".format(zone, balance).encode()
+def _collect(commands: dict, request: bytes):
+    """
+    :param commands: set commands keyed by zone and attribute, i.e. b"11VO"
+    :param request: one or more set commands, replacing the ones in commands
+    for the same zone and attribute
+    """
+    for command in request.split(b"\r")[:-1]:
+        commands[command[1:5]] = command + b"\r"
 
 
-def _format_set_source(zone: int, source: int) -> bytes:
-    source = int(max(1, min(source, 6)))
-    return "<{}CH{:02}\r".format(zone, source).encode()
+def _format_apply_scene(scene, current) -> bytes:
+    """
+    :param scene: Scene to apply
+    :param current: current statuses of the zones of the scene. Zones
+    missing from it are skipped.
+    :return: set commands for the attributes that differ, zone by zone
+    """
+    current = {status.zone: status for status in current}
+    return b"".join(
+        _format_restore_zone(status, current[status.zone]) for status in scene.statuses if status.zone in current
+    )
 
 
-def get_ws66i(host_name: str, host_port=8080):
+def _format_restore_zone(status: ZoneStatus, current: ZoneStatus) -> bytes:
+    """
+    :param status: zone state to restore
+    :param current: current state of the zone
+    :return: set commands for the attributes of status that differ from
+    current, power first and source last
+    """
+    changed = current.diff(status)
+    return b"".join(
+        _format(status.zone, changed[field]) for field, _format in _RESTORE_FORMATTERS if field in changed
+    )
+
+
+_RESTORE_FORMATTERS = (
+    ("power", format_set_power),
+    ("mute", format_set_mute),
+    ("volume", format_set_volume),
+    ("treble", format_set_treble),
+    ("bass", format_set_bass),
+    ("balance", format_set_balance),
+    ("source", format_set_source),
+)
+
+
+def get_ws66i(
+    host_name: str,
+    host_port=8080,
+    cache_ttl=None,
+    coalesce_window=None,
+    transport=None,
+    breaker=None,
+    rtt_estimator=None,
+    topology=None,
+    metrics=None,
+    capture=None,
+):
     """
     Return synchronous version of the WS66i interface
     :param host_name: host name, i.e. '192.168.1.123'
     :param host_port: must be 8080
+    :param cache_ttl: number of seconds zone_status answers from an in-memory
+    cache of the zone before asking the WS66i again. None disables the cache.
+    :param coalesce_window: number of seconds set_volume, set_treble, set_bass
+    and set_balance are held back. Calls for the same zone and attribute within
+    the window collapse to the last value and everything pending is sent in a
+    single write when the window ends. None sends every call right away.
+    :param transport: Transport carrying the protocol. Defaults to a new
+    SocketTransport, pass TelnetTransport() to use telnetlib instead.
+    :param breaker: CircuitBreaker that makes requests fail immediately
+    while the WS66i is unreachable. The client then probes for it in the
+    background and resumes once it answers. Its state can be read and
+    listened to by the caller. None retries the connection on every
+    status request instead.
+    :param rtt_estimator: RttEstimator that derives the time to wait for
+    a reply from the measured round-trip times. None always waits TIMEOUT.
+    :param topology: list of connected controllers as returned by
+    topology() of an earlier client. None polls every zone asked for until
+    probe_topology is called.
+    :param metrics: Metrics collecting latencies, errors, reconnects, lock
+    waits and traffic of the client. None collects nothing.
+    :param capture: WireCapture recording the raw traffic of the client
     :return: synchronous implementation of WS66i interface
     """
 
-    lock = RLock()
-
-    def synchronized(func):
+    def synchronized(func, priority=PRIORITY_INTERACTIVE):
+        """
+        Run the method on the I/O worker, one call at a time
+        """
         @wraps(func)
-        def wrapper(*args, **kwargs):
-            with lock:
-                return func(*args, **kwargs)
+        def wrapper(self, *args, **kwargs):
+            return self._call(priority, func, self, *args, **kwargs)
 
+        wrapper.priority = priority
         return wrapper
 
+    def polling(func):
+        """
+        Like synchronized, queued behind the interactive calls
+        """
+        return synchronized(func, PRIORITY_BACKGROUND)
+
     class WS66iSync(WS66i):
-        def __init__(self, host_name: str, host_port: int):
+        def __init__(
+            self,
+            host_name: str,
+            host_port: int,
+            cache_ttl,
+            coalesce_window,
+            transport,
+            breaker,
+            rtt_estimator,
+            topology,
+            metrics,
+        ):
             self._host_name = host_name
             self._host_port = host_port
             self._connected = False
-            self._telnet = Telnet()
+            self._transport = transport if transport is not None else SocketTransport()
+            if capture is not None:
+                self._transport.capture = capture
+            self._cache = _ZoneStatusCache(cache_ttl) if cache_ttl is not None else None
+            self._coalesce_window = coalesce_window
+            # Coalesced set commands keyed by zone and attribute, i.e. b"11VO"
+            self._pending = {}
+            # Set commands of the batch of each thread, keyed like _pending
+            self._batches = local()
+            self._pending_lock = Lock()
+            self._flush_timer = None
+            # Running volume fades keyed by zone
+            self._fades = {}
+            self._fade_lock = Lock()
+            self._fader = None
+            self._breaker = breaker
+            self._rtt = rtt_estimator
+            self._controllers = tuple(topology) if topology is not None else None
+            self._metrics = metrics
+            # Transport byte counters already added to the metrics
+            self._bytes_counted = (self._transport.bytes_sent, self._transport.bytes_received)
+            self._bytes_lock = Lock()
+            self._prober = None
+            self._probe_stop = None
+            # The I/O worker is the only thread writing to the connection. It
+            # runs the calls queued by submit one after the other.
+            self._queue = _CallQueue()
+            self._worker = None
+            self._worker_lock = Lock()
+            self._callbacks = []
+            self._listener = None
+            self._listener_stop = None
+            # Zone statuses read by the listener for the callback thread
+            self._updates = None
+            # Replies the listener hands over to _process_request_zones
+            self._reply_cond = Condition()
+            self._awaiting = set()
+            self._replies = {}
 
         def __del__(self):
-            self._telnet.close()
+            # The worker only holds a weak reference, let it exit
+            self._queue.put(PRIORITY_BACKGROUND, None)
+            self._transport.close()
+
+        def submit(self, func, *args, priority=None, **kwargs):
+            """
+            Queue a call for the I/O worker, like Executor.submit. Every
+            method of the client is such a call waiting for its own result,
+            so ws66i.submit(ws66i.zone_status, 11) returns right away.
+            :param func: callable, usually a method of the client
+            :param priority: PRIORITY_INTERACTIVE or PRIORITY_BACKGROUND. None
+            uses the priority of the method, status requests are background
+            and everything else interactive.
+            :return: concurrent.futures.Future of the result of func
+            """
+            if priority is None:
+                priority = getattr(func, "priority", PRIORITY_INTERACTIVE)
+            future = Future()
+            with self._worker_lock:
+                self._queue.put(priority, (future, func, args, kwargs, time.perf_counter()))
+                if self._worker is None:
+                    self._worker = Thread(
+                        target=self._work, args=(weakref.ref(self), self._queue), name="ws66i-io", daemon=True
+                    )
+                    self._worker.start()
+            return future
+
+        def _call(self, priority: str, func, *args, **kwargs):
+            """
+            Run func on the I/O worker and wait for its result. Calls made by
+            the worker itself run right away.
+            """
+            if current_thread() is self._worker:
+                return func(*args, **kwargs)
+            return self.submit(func, *args, priority=priority, **kwargs).result()
+
+        @staticmethod
+        def _work(client_ref, requests: _CallQueue):
+            """
+            Body of the I/O worker thread. Runs the queued calls until it
+            finds the None put by _stop_worker or __del__. The client is only
+            referenced while a call runs, so a client dropped without close()
+            can still be collected.
+            """
+            while True:
+                priority, request = requests.get()
+                client = client_ref()
+                if request is None:
+                    return
+                if client is None:
+                    request[0].cancel()
+                    return
+                future, func, args, kwargs, submitted = request
+                if future.set_running_or_notify_cancel():
+                    client._lock_acquired(submitted, priority)
+                    try:
+                        future.set_result(func(*args, **kwargs))
+                    except BaseException as error:  # pylint: disable=broad-except
+                        future.set_exception(error)
+                # Drop the references to the client before waiting for the next call
+                del client, request, future, func, args, kwargs
+
+        def _stop_worker(self):
+            with self._worker_lock:
+                worker, self._worker = self._worker, None
+                if worker is None:
+                    return
+                # Calls queued from now on go to the next worker. The None
+                # is taken after every call queued before it.
+                self._queue.put(PRIORITY_BACKGROUND, None)
+                self._queue = _CallQueue()
+            if worker is not current_thread():
+                worker.join()
 
         def open(self):
+            self._call(PRIORITY_INTERACTIVE, self._open)
+
+        def _open(self):
+            if self._breaker is not None and not self._breaker.allow():
+                raise ConnectionError("WS66i is unreachable")
             try:
-                self._telnet.open(self._host_name, self._host_port, TIMEOUT)
+                self._transport.open(self._host_name, self._host_port, TIMEOUT)
                 self._connected = True
             except (TimeoutError, OSError, socket.timeout, socket.gaierror) as err:
                 raise ConnectionError from err
 
-        @synchronized
+            if self._callbacks:
+                self._start_listener()
+
         def close(self):
-            self._telnet.close()
+            self._call(PRIORITY_INTERACTIVE, self._close)
+            self._stop_worker()
+
+        def _close(self):
+            self.cancel_fade()
+            self.flush()
+            self._stop_probe()
+            self._drop_connection()
             self._connected = False
+            if self._breaker is not None:
+                self._breaker.reset()
 
-        def _process_request(self, request: bytes, expect_zone=None):
+        def _connection_lost(self):
+            """
+            The WS66i stopped answering, most likely it was turned off
+            """
+            self._drop_connection()
+            self._record_failure()
+
+        def _record_failure(self):
+            if self._breaker is not None and self._breaker.record_failure():
+                self._start_probe()
+
+        def _start_probe(self):
+            if self._prober is not None and self._prober.is_alive():
+                return
+            self._probe_stop = Event()
+            self._prober = Thread(target=self._probe, args=(self._probe_stop,), name="ws66i-probe", daemon=True)
+            self._prober.start()
+
+        def _stop_probe(self):
+            if self._prober is None:
+                return
+            self._probe_stop.set()
+            if self._prober is not current_thread():
+                self._prober.join()
+            self._prober = None
+
+        def _probe(self, stop: Event):
+            """
+            Body of the probe thread. Tries to reconnect with backoff until it
+            succeeds or is stopped. Requests fail immediately meanwhile, so
+            the probe is the only user of the transport.
+            """
+            while not stop.wait(self._breaker.next_delay()):
+                self._breaker.start_probe()
+                self._count("reconnect_attempts")
+                try:
+                    self._transport.open(self._host_name, self._host_port, TIMEOUT)
+                except (TimeoutError, OSError, socket.timeout, socket.gaierror) as error:
+                    _LOGGER.debug('Probe failed with exception: %s', repr(error))
+                    self._breaker.record_failure()
+                    continue
+
+                _LOGGER.debug('WS66i is reachable again')
+                self._count("reconnects")
+                # The listener must own reading before requests are let through
+                if self._callbacks:
+                    self._start_listener()
+                self._breaker.record_success()
+                return
+
+        def _drop_connection(self):
+            """
+            Close the connection without forgetting that open() was called
+            """
+            self._stop_listener()
+            self._transport.close()
+            if self._cache is not None:
+                self._cache.clear()
+
+        @synchronized
+        def subscribe(self, callback):
+            if callback not in self._callbacks:
+                self._callbacks.append(callback)
+            if self._connected and self._transport.is_open():
+                self._start_listener()
+
+        @synchronized
+        def unsubscribe(self, callback):
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+            if not self._callbacks:
+                self._stop_listener()
+
+        def _listening(self):
+            return self._listener is not None and self._listener.is_alive()
+
+        def _start_listener(self):
+            if self._listening():
+                return
+            self._listener_stop = Event()
+            # Callbacks run on their own thread, so one that calls the client
+            # can't keep the listener from delivering the reply it waits for
+            self._updates = queue.Queue()
+            Thread(target=self._deliver, args=(self._updates,), name="ws66i-callbacks", daemon=True).start()
+            self._listener = Thread(
+                target=self._listen, args=(self._listener_stop, self._updates), name="ws66i-listener", daemon=True
+            )
+            self._listener.start()
+
+        def _stop_listener(self):
+            if self._listener is None:
+                return
+            self._listener_stop.set()
+            if self._listener is not current_thread():
+                self._listener.join()
+            self._listener = None
+            # The callback thread is not joined, it may be running a callback
+            # waiting for this very call
+            self._updates.put(None)
+            self._updates = None
+
+        def _deliver(self, updates: queue.Queue):
+            """
+            Body of the callback thread. Calls the callbacks with every zone
+            status the listener read until it finds the None put by
+            _stop_listener.
+            """
+            while True:
+                status = updates.get()
+                if status is None:
+                    return
+                for callback in list(self._callbacks):
+                    try:
+                        callback(status)
+                    except Exception:  # pylint: disable=broad-except
+                        _LOGGER.exception('Error in zone status callback')
+
+        def _listen(self, stop: Event, updates: queue.Queue):
+            """
+            Body of the listener thread. Reads the connection line by line
+            and dispatches every zone status line until stopped or the
+            connection is lost.
+            """
+            buffer = b""
+            while not stop.is_set():
+                try:
+                    buffer += self._transport.read_line(LISTEN_INTERVAL)
+                    self._count_bytes()
+                except (EOFError, OSError, AttributeError) as error:
+                    if not stop.is_set():
+                        # Most likely the amp was turned off. Drop the connection
+                        # so the next zone_status call re-establishes it.
+                        _LOGGER.error('Listener lost connection: %s', repr(error))
+                        self._transport.close()
+                    break
+
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    self._dispatch(line, updates)
+
+            with self._reply_cond:
+                self._reply_cond.notify_all()
+
+        def _dispatch(self, line: bytes, updates: queue.Queue):
+            status = ZoneStatus.from_line(line)
+            if status is None:
+                return
+            _LOGGER.debug('Received "%s"', line)
+
+            with self._reply_cond:
+                if status.zone in self._awaiting:
+                    self._awaiting.discard(status.zone)
+                    self._replies[status.zone] = status
+                    self._reply_cond.notify_all()
+
+            if self._cache is not None:
+                self._cache.put(status)
+            updates.put(status)
+
+        def _count(self, counter: str, amount=1):
+            if self._metrics is not None:
+                self._metrics.increment(counter, amount)
+
+        def _count_error(self, error: Exception):
+            if isinstance(error, BrokenPipeError):
+                self._count("broken_pipe")
+            elif isinstance(error, (TimeoutError, socket.timeout)):
+                self._count("timeouts")
+            else:
+                self._count("errors")
+
+        def _count_bytes(self):
+            """
+            Add the traffic of the transport since the last call to the metrics
+            """
+            if self._metrics is None:
+                return
+            with self._bytes_lock:
+                sent, received = self._transport.bytes_sent, self._transport.bytes_received
+                counted_sent, counted_received = self._bytes_counted
+                self._bytes_counted = (sent, received)
+            self._count("bytes_sent", sent - counted_sent)
+            self._count("bytes_received", received - counted_received)
+
+        def _lock_acquired(self, start: float, priority: str):
+            """
+            :param start: time.perf_counter() when the call was queued for
+            the I/O worker
+            :param priority: priority the call was queued with
+            """
+            if self._metrics is not None:
+                self._metrics.observe_lock_wait(time.perf_counter() - start, priority)
+
+        def _wait_for_replies(self, expect_zones, timeout: float, sent: float):
+            """
+            Wait for the listener to hand over the reply of every zone
+            :param exepct_zones: The zones to fetch data from
+            :param timeout: number of seconds to wait for each reply
+            :param sent: time.monotonic() when the request was written
+            :return: list of ZoneStatus or None
+            """
+            statuses = []
+            with self._reply_cond:
+                try:
+                    for zone in expect_zones:
+                        deadline = time.monotonic() + timeout
+                        while zone not in self._replies:
+                            remaining = deadline - time.monotonic()
+                            if remaining <= 0 or not self._listening():
+                                _LOGGER.error('Zone "%s" produced no result', zone)
+                                return None
+                            self._reply_cond.wait(remaining)
+                        statuses.append(self._replies.pop(zone))
+                        if len(statuses) == 1:
+                            self._add_rtt_sample(time.monotonic() - sent)
+                finally:
+                    self._awaiting.difference_update(expect_zones)
+            return statuses
+
+        def _reply_timeout(self, timeout):
+            """
+            :param timeout: number of seconds requested by the caller or None
+            :return: number of seconds to wait for a reply
+            """
+            if timeout is not None:
+                return timeout
+            if self._rtt is not None:
+                return self._rtt.timeout()
+            return TIMEOUT
+
+        def _add_rtt_sample(self, rtt: float):
+            if self._rtt is not None:
+                self._rtt.add_sample(rtt)
+
+        def _process_request(self, request: bytes, expect_zone=None, timeout=None):
             """
             :param request: request that is sent to the WS66i
             :param exepct_zone: The zone to fetch data from
-            :return: Match object or None
+            :param timeout: number of seconds to wait for the reply, None to
+            use the timeout of the client
+            :return: ZoneStatus or None
             """
+            if expect_zone is None:
+                self._process_request_zones(request, [])
+                return None
+            statuses = self._process_request_zones(request, [expect_zone], timeout)
+            return statuses[0] if statuses else None
+
+        def _process_request_zones(self, request: bytes, expect_zones, timeout=None):
+            """
+            :param request: request that is sent to the WS66i
+            :param exepct_zones: The zones to fetch data from, in the order
+            the WS66i replies with them
+            :param timeout: number of seconds to wait for each reply, None to
+            use the timeout of the client
+            :return: list of ZoneStatus or None
+            """
+            if self._breaker is not None and not self._breaker.allow():
+                _LOGGER.debug('WS66i is unreachable, not sending "%s"', request)
+                return None
+
             _LOGGER.debug('Sending "%s"', request)
+            statuses = []
+            listening = self._listening()
+            if listening:
+                with self._reply_cond:
+                    self._awaiting.update(expect_zones)
+                    for zone in expect_zones:
+                        self._replies.pop(zone, None)
+            reply_timeout = self._reply_timeout(timeout)
+            start = time.perf_counter()
             try:
-                self._telnet.write(request)
-                if expect_zone is not None:
-                    # Exepct a regex string to prevent unsynchronized behavior when
-                    # multiple clients communicate simultaneously with the WS66i
-                    expect_str = f"({expect_zone})(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)"
-                    resp = self._telnet.expect([expect_str.encode()], timeout=TIMEOUT)
-                    _LOGGER.debug('Received "%s"', str(resp[1]))
-                    return resp[1]
+                self._transport.write(request)
+                sent = time.monotonic()
+                if listening:
+                    # The listener owns reading from the connection
+                    statuses = self._wait_for_replies(expect_zones, reply_timeout, sent)
+                    if statuses is None:
+                        self._reply_lost(timeout)
+                        return None
+                else:
+                    for expect_zone in expect_zones:
+                        # Exepct a regex to prevent unsynchronized behavior when
+                        # multiple clients communicate simultaneously with the WS66i
+                        match = self._transport.expect(zone_pattern(expect_zone), reply_timeout)
+                        _LOGGER.debug('Received "%s"', match)
+                        if match is None:
+                            self._reply_lost(timeout)
+                            return None
+                        statuses.append(ZoneStatus.from_string(match))
+                        if len(statuses) == 1:
+                            self._add_rtt_sample(time.monotonic() - sent)
+                if self._breaker is not None and expect_zones:
+                    self._breaker.record_success()
+                if self._metrics is not None:
+                    self._metrics.observe_latency(command_name(request), time.perf_counter() - start)
+                return statuses
 
             except UnboundLocalError:
                 _LOGGER.error('Bad Write Request')
+                self._count("errors")
             except EOFError:
-                _LOGGER.error('Expect str "%s" produced no result', expect_str)
-            except (TimeoutError, socket.timeout, BrokenPipeError) as error:
+                _LOGGER.error('Zones "%s" produced no result', list(expect_zones))
+                self._count("eof")
+            except (TimeoutError, socket.timeout, OSError) as error:
                 _LOGGER.error('Timed-Out with exception: %s', repr(error))
+                self._count_error(error)
+            finally:
+                self._count_bytes()
 
             return None
 
-        @synchronized
-        def zone_status(self, zone: int):
+        def _reply_lost(self, timeout):
+            """
+            :param timeout: number of seconds requested by the caller or None
+            """
+            self._count("timeouts")
+            if timeout is None and self._rtt is not None:
+                # Back off so a slow WS66i gets more time on the next request
+                self._rtt.on_timeout()
+
+        def _check_connection(self):
+            """
+            :return: True if the connection is usable for a status request
+            """
             # Check if socket is open before reading zone status
             # Did the caller called open first?
             if not self._connected:
                 _LOGGER.debug('Connection needed first')
-                return None
+                return False
+
+            if self._breaker is not None and not self._breaker.allow():
+                # The probe thread re-establishes the connection
+                return False
 
-            if not self._telnet.get_socket():
+            if not self._transport.is_open():
                 # The connection should be established, but an error was
                 # encountered (most likely amp was turned off)
                 # Attempt to re-establish the connection.
+                self._count("reconnect_attempts")
                 try:
                     self.open()
                 except ConnectionError:
-                    return None
+                    self._record_failure()
+                    return False
+                self._count("reconnects")
+
+            return True
 
-            zone_status = ZoneStatus.from_string(self._process_request(_format_zone_status_request(zone), zone))
+        def _send_command(self, request: bytes, timeout=None):
+            """
+            Send a set command and write its value through to the cache
+            :param request: set command sent to the WS66i
+            :param timeout: number of seconds to wait for the connection to
+            be free, None to wait as long as it takes
+            """
+            if self._batched(request):
+                return
+            if current_thread() is self._worker:
+                self._write_command(request)
+                return
+            future = self.submit(self._write_command, request)
+            try:
+                future.result(timeout)
+            except FutureTimeoutError:
+                future.cancel()
+                _LOGGER.error('Timed-Out waiting to send "%s"', request)
+
+        def _write_command(self, request: bytes):
+            if self._process_request_zones(request, []) is not None and self._cache is not None:
+                self._cache.apply(request)
+
+        def _send_continuous(self, request: bytes, timeout=None):
+            """
+            Send a set command of a continuous control, coalescing it with
+            other calls for the same zone and attribute when enabled
+            :param request: set command sent to the WS66i
+            :param timeout: number of seconds to wait for the connection to
+            be free. Coalesced commands never wait.
+            """
+            if self._batched(request):
+                return
+            if self._coalesce_window is None:
+                self._send_command(request, timeout)
+                return
+
+            with self._pending_lock:
+                self._pending[request[1:5]] = request
+                if self._flush_timer is None:
+                    self._flush_timer = Timer(self._coalesce_window, self.flush)
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+
+        def _batched(self, request: bytes) -> bool:
+            """
+            :return: True if request was added to the batch of the thread
+            """
+            commands = getattr(self._batches, "commands", None)
+            if commands is None:
+                return False
+            _collect(commands, request)
+            return True
+
+        @contextmanager
+        def batch(self):
+            if getattr(self._batches, "commands", None) is not None:
+                # Nested, the outer batch sends everything
+                yield
+                return
+
+            commands = self._batches.commands = {}
+            try:
+                yield
+            finally:
+                self._batches.commands = None
+
+            if commands:
+                with self._pending_lock:
+                    # Coalesced values sent later must not override the batch
+                    for key in commands:
+                        self._pending.pop(key, None)
+                self._send_command(b"".join(commands.values()))
+
+        @synchronized
+        def flush(self):
+            """
+            Send the set commands held back by coalescing right away, in a
+            single write. Does nothing when coalescing is disabled.
+            """
+            with self._pending_lock:
+                pending, self._pending = self._pending, {}
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+
+            if pending:
+                self._send_command(b"".join(pending.values()))
+
+        def fade_volume(self, zones, target: int, duration: float):
+            """
+            Ramp the volume of zones from their current volume to target.
+            A background thread sends the steps every FADE_INTERVAL seconds,
+            with the steps of every fading zone in a single write. Setting
+            the volume of a fading zone cancels its fade.
+            :param zones: list of zones 11..16, 21..26, 31..36
+            :param target: integer from 0 to 38 inclusive
+            :param duration: number of seconds the ramp takes
+            :return: threading.Event that is set once every zone has reached
+            target or had its fade cancelled
+            """
+            target = int(max(0, min(target, 38)))
+            done = Event()
+            statuses = self.zone_statuses(zones)
+            if not statuses:
+                done.set()
+                return done
+
+            group = []
+            with self._fade_lock:
+                for status in dict((status.zone, status) for status in statuses).values():
+                    self._cancel_fade(status.zone)
+                    fade = _VolumeFade(status.volume, target, duration, group, done)
+                    group.append(fade)
+                    self._fades[status.zone] = fade
+
+                if self._fader is None:
+                    self._fader = Thread(target=self._run_fades, name="ws66i-fader", daemon=True)
+                    self._fader.start()
+            return done
+
+        def cancel_fade(self, zone=None):
+            """
+            Stop fading a zone at its current volume
+            :param zone: zone 11..16, 21..26, 31..36, or None for all zones
+            """
+            with self._fade_lock:
+                for fade_zone in list(self._fades) if zone is None else [zone]:
+                    self._cancel_fade(fade_zone)
+
+        def _cancel_fade(self, zone: int):
+            fade = self._fades.pop(zone, None)
+            if fade is not None:
+                fade.finish()
+
+        def _run_fades(self):
+            """
+            Body of the fader thread. Sends one write per tick until no fades
+            are left.
+            """
+            while True:
+                time.sleep(FADE_INTERVAL)
+                now = time.monotonic()
+                requests = []
+                finished = []
+                future = None
+                with self._fade_lock:
+                    if not self._fades:
+                        self._fader = None
+                        return
+                    for zone, fade in list(self._fades.items()):
+                        volume = fade.volume_at(now)
+                        if volume != fade.sent:
+                            requests.append(format_set_volume(zone, volume))
+                            fade.sent = volume
+                        if now >= fade.end_time:
+                            finished.append(self._fades.pop(zone))
+
+                    # Queued under the lock, so a set_volume cancelling the
+                    # fade is always written after this step
+                    if requests:
+                        future = self.submit(self._write_command, b"".join(requests))
+
+                if future is not None:
+                    future.result()
+
+                with self._fade_lock:
+                    for fade in finished:
+                        fade.finish()
+
+        def _cache_put(self, status: ZoneStatus):
+            if self._cache is not None and status is not None:
+                self._cache.put(status)
+
+        def _absent(self, zone: int) -> bool:
+            """
+            :return: True if the topology is known and lacks the controller
+            of the zone
+            """
+            return self._controllers is not None and zone // 10 not in self._controllers
+
+        def topology(self):
+            return list(self._controllers) if self._controllers is not None else None
+
+        @polling
+        def probe_topology(self, timeout=None):
+            if not self._check_connection():
+                return None
+
+            # Missing expanders don't reply. That is expected here, so their
+            # timeouts must not back off the adaptive timeout.
+            timeout = self._reply_timeout(timeout)
+            controllers = []
+            for controller in CONTROLLERS:
+                statuses = self._process_request_zones(
+                    format_controller_status_request(controller), controller_zones(controller), timeout
+                )
+                if statuses is None:
+                    if controller == 1:
+                        # Amp is most likely turned off. Close the connection.
+                        self._connection_lost()
+                        return None
+                    continue
+                controllers.append(controller)
+                for status in statuses:
+                    self._cache_put(status)
+
+            _LOGGER.debug('Found controllers %s', controllers)
+            self._controllers = tuple(controllers)
+            return controllers
+
+        @polling
+        def zone_status(self, zone: int, timeout=None):
+            if self._absent(zone):
+                return None
+
+            if self._cache is not None and self._connected:
+                zone_status = self._cache.get(zone)
+                if zone_status is not None:
+                    return zone_status
+
+            if not self._check_connection():
+                return None
+
+            zone_status = self._process_request(format_zone_status_request(zone), zone, timeout)
             if zone_status is None:
                 # Amp is most likely turned off. Close the connection.
                 # Future calls to zone_status will try to reconnect.
-                self._telnet.close()
+                self._connection_lost()
 
+            self._cache_put(zone_status)
             return zone_status
 
-        @synchronized
-        def set_power(self, zone: int, power: bool):
-            self._process_request(_format_set_power(zone, power))
+        @polling
+        def controller_status(self, controller: int, timeout=None):
+            if self._absent(controller * 10 + 1) or not self._check_connection():
+                return None
 
-        @synchronized
-        def set_mute(self, zone: int, mute: bool):
-            self._process_request(_format_set_mute(zone, mute))
+            statuses = self._process_request_zones(
+                format_controller_status_request(controller), controller_zones(controller), timeout
+            )
+            if statuses is None:
+                # Amp is most likely turned off. Close the connection.
+                # Future calls will try to reconnect.
+                self._connection_lost()
+                return None
 
-        @synchronized
-        def set_volume(self, zone: int, volume: int):
-            self._process_request(_format_set_volume(zone, volume))
+            for status in statuses:
+                self._cache_put(status)
+            return statuses
+
+        @polling
+        def zone_statuses(self, zones, timeout=None):
+            zones = [zone for zone in zones if not self._absent(zone)]
+            statuses = {}
+            if self._cache is not None and self._connected:
+                for zone in zones:
+                    zone_status = self._cache.get(zone)
+                    if zone_status is not None:
+                        statuses[zone] = zone_status
+
+            # Each zone is requested once, replies come back in request order
+            missing = list(dict.fromkeys(zone for zone in zones if zone not in statuses))
+            if missing:
+                if not self._check_connection():
+                    return None
 
-        @synchronized
-        def set_treble(self, zone: int, treble: int):
-            self._process_request(_format_set_treble(zone, treble))
+                request = b"".join(format_zone_status_request(zone) for zone in missing)
+                replies = self._process_request_zones(request, missing, timeout)
+                if replies is None:
+                    # Amp is most likely turned off. Close the connection.
+                    # Future calls will try to reconnect.
+                    self._connection_lost()
+                    return None
 
-        @synchronized
-        def set_bass(self, zone: int, bass: int):
-            self._process_request(_format_set_bass(zone, bass))
+                for zone_status in replies:
+                    self._cache_put(zone_status)
+                    statuses[zone_status.zone] = zone_status
 
-        @synchronized
-        def set_balance(self, zone: int, balance: int):
-            self._process_request(_format_set_balance(zone, balance))
+            return [statuses[zone] for zone in zones]
 
-        @synchronized
-        def set_source(self, zone: int, source: int):
-            self._process_request(_format_set_source(zone, source))
+        def set_power(self, zone: int, power: bool, timeout=None):
+            self._send_command(format_set_power(zone, power), timeout)
+
+        def set_mute(self, zone: int, mute: bool, timeout=None):
+            self._send_command(format_set_mute(zone, mute), timeout)
+
+        def set_volume(self, zone: int, volume: int, timeout=None):
+            self.cancel_fade(zone)
+            self._send_continuous(format_set_volume(zone, volume), timeout)
+
+        def set_treble(self, zone: int, treble: int, timeout=None):
+            self._send_continuous(format_set_treble(zone, treble), timeout)
+
+        def set_bass(self, zone: int, bass: int, timeout=None):
+            self._send_continuous(format_set_bass(zone, bass), timeout)
+
+        def set_balance(self, zone: int, balance: int, timeout=None):
+            self._send_continuous(format_set_balance(zone, balance), timeout)
+
+        def set_source(self, zone: int, source: int, timeout=None):
+            self._send_command(format_set_source(zone, source), timeout)
 
         @synchronized
         def restore_zone(self, status: ZoneStatus):
-            self.set_power(status.zone, status.power)
-            self.set_mute(status.zone, status.mute)
-            self.set_volume(status.zone, status.volume)
-            self.set_treble(status.zone, status.treble)
-            self.set_bass(status.zone, status.bass)
-            self.set_balance(status.zone, status.balance)
-            self.set_source(status.zone, status.source)
-
-    return WS66iSync(host_name, host_port)
+            # Fades and pending coalesced values must not override the restored state
+            self.cancel_fade(status.zone)
+            self.flush()
+            current = self.zone_status(status.zone)
+            if current is None:
+                _LOGGER.error('Zone "%s" could not be restored, its state is unknown', status.zone)
+                return
+
+            request = _format_restore_zone(status, current)
+            if request:
+                self._send_command(request)
+
+        def capture_scene(self, name: str, zones, timeout=None):
+            statuses = self.zone_statuses(zones, timeout)
+            if statuses is None:
+                return None
+            return Scene(name, statuses)
+
+        @synchronized
+        def apply_scene(self, scene):
+            # Fades and pending coalesced values must not override the scene
+            for zone in scene.zones:
+                self.cancel_fade(zone)
+            self.flush()
+            current = self.zone_statuses(scene.zones)
+            if current is None:
+                _LOGGER.error('Scene "%s" could not be applied, the state of its zones is unknown', scene.name)
+                return
+
+            request = _format_apply_scene(scene, current)
+            if request:
+                self._send_command(request)
+
+    return WS66iSync(
+        host_name, host_port, cache_ttl, coalesce_window, transport, breaker, rtt_estimator, topology, metrics
+    )
+
+
+def get_async_ws66i(
+    host_name: str, host_port=8080, rtt_estimator=None, topology=None, metrics=None, capture=None
+):
+    """
+    Return asynchronous version of the WS66i interface
+    :param host_name: host name, i.e. '192.168.1.123'
+    :param host_port: must be 8080
+    :param rtt_estimator: RttEstimator that derives the time to wait for
+    a reply from the measured round-trip times. None always waits TIMEOUT.
+    :param topology: list of connected controllers as returned by
+    topology() of an earlier client. None polls every zone asked for until
+    probe_topology is called.
+    :param metrics: Metrics collecting latencies, errors, reconnects, lock
+    waits and traffic of the client. None collects nothing.
+    :param capture: WireCapture recording the raw traffic of the client
+    :return: asynchronous implementation of WS66i interface. Every method
+    of the WS66i interface is a coroutine.
+    """
+
+    lock = asyncio.Lock()
+
+    def locked_coro(coro):
+        @wraps(coro)
+        async def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            async with lock:
+                self._lock_acquired(start)
+                return await coro(self, *args, **kwargs)
+
+        return wrapper
+
+    class WS66iAsync(WS66i):
+        def __init__(self, host_name: str, host_port: int, rtt_estimator, topology, metrics):
+            self._host_name = host_name
+            self._host_port = host_port
+            self._rtt = rtt_estimator
+            self._metrics = metrics
+            self._capture = capture
+            self._controllers = tuple(topology) if topology is not None else None
+            self._connected = False
+            self._writer = None
+            self._read_task = None
+            self._callbacks = []
+            # Futures waiting on the next status line of a zone
+            self._waiters = {}
+
+        async def open(self):
+            try:
+                reader, self._writer = await asyncio.wait_for(
+                    asyncio.open_connection(self._host_name, self._host_port), TIMEOUT
+                )
+                self._connected = True
+            except (asyncio.TimeoutError, OSError, socket.gaierror) as err:
+                raise ConnectionError from err
+
+            # The reader task owns the receiving side of the stream
+            self._read_task = asyncio.ensure_future(self._read_loop(reader, self._writer))
+
+        @locked_coro
+        async def close(self):
+            self._close_stream()
+            self._connected = False
+
+        async def subscribe(self, callback):
+            if callback not in self._callbacks:
+                self._callbacks.append(callback)
+
+        async def unsubscribe(self, callback):
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+        def _close_stream(self):
+            if self._read_task is not None and self._read_task is not asyncio.current_task():
+                self._read_task.cancel()
+            if self._writer is not None:
+                self._writer.close()
+            self._read_task = None
+            self._writer = None
+
+        async def _read_loop(self, reader, writer):
+            """
+            Body of the reader task. Reads the stream line by line and
+            dispatches every zone status line until the stream is closed.
+            """
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    self._count("bytes_received", len(line))
+                    if self._capture is not None:
+                        self._capture.record(RECEIVED, line)
+                    self._dispatch(line)
+            except (ConnectionError, ValueError) as error:
+                _LOGGER.error('Reader lost connection: %s', repr(error))
+
+            # Most likely the amp was turned off. Drop the stream so the
+            # next zone_status call re-establishes it.
+            for waiters in self._waiters.values():
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(EOFError())
+            if self._writer is writer:
+                self._close_stream()
+
+        def _dispatch(self, line: bytes):
+            status = ZoneStatus.from_line(line)
+            if status is None:
+                return
+            _LOGGER.debug('Received "%s"', line)
+
+            for waiter in self._waiters.pop(status.zone, []):
+                if not waiter.done():
+                    waiter.set_result(status)
+
+            for callback in list(self._callbacks):
+                try:
+                    callback(status)
+                except Exception:  # pylint: disable=broad-except
+                    _LOGGER.exception('Error in zone status callback')
+
+        async def _process_request(self, request: bytes, expect_zone=None, timeout=None):
+            """
+            :param request: request that is sent to the WS66i
+            :param exepct_zone: The zone to fetch data from
+            :param timeout: number of seconds to wait for the reply, None to
+            use the timeout of the client
+            :return: ZoneStatus or None
+            """
+            if expect_zone is None:
+                await self._process_request_zones(request, [])
+                return None
+            statuses = await self._process_request_zones(request, [expect_zone], timeout)
+            return statuses[0] if statuses else None
+
+        async def _process_request_zones(self, request: bytes, expect_zones, timeout=None):
+            """
+            :param request: request that is sent to the WS66i
+            :param exepct_zones: The zones to fetch data from, in the order
+            the WS66i replies with them
+            :param timeout: number of seconds to wait for each reply, None to
+            use the timeout of the client
+            :return: list of ZoneStatus or None
+            """
+            _LOGGER.debug('Sending "%s"', request)
+            loop = asyncio.get_running_loop()
+            waiters = []
+            for zone in expect_zones:
+                waiter = loop.create_future()
+                self._waiters.setdefault(zone, []).append(waiter)
+                waiters.append(waiter)
+            reply_timeout = self._reply_timeout(timeout)
+            start = time.perf_counter()
+            try:
+                self._writer.write(request)
+                await self._writer.drain()
+                sent = loop.time()
+                self._count("bytes_sent", len(request))
+                if self._capture is not None:
+                    self._capture.record(SENT, request)
+                if waiters and (self._read_task is None or self._read_task.done()):
+                    raise EOFError
+                statuses = []
+                for waiter in waiters:
+                    statuses.append(await asyncio.wait_for(waiter, reply_timeout))
+                    if len(statuses) == 1:
+                        self._add_rtt_sample(loop.time() - sent)
+                if self._metrics is not None:
+                    self._metrics.observe_latency(command_name(request), time.perf_counter() - start)
+                return statuses
+
+            except AttributeError:
+                _LOGGER.error('Bad Write Request')
+                self._count("errors")
+            except EOFError:
+                _LOGGER.error('Zones "%s" produced no result', list(expect_zones))
+                self._count("eof")
+            except asyncio.TimeoutError as error:
+                _LOGGER.error('Timed-Out with exception: %s', repr(error))
+                self._count("timeouts")
+                if timeout is None and self._rtt is not None:
+                    # Back off so a slow WS66i gets more time on the next request
+                    self._rtt.on_timeout()
+            except ConnectionError as error:
+                _LOGGER.error('Timed-Out with exception: %s', repr(error))
+                self._count("broken_pipe" if isinstance(error, BrokenPipeError) else "errors")
+            finally:
+                for zone, waiter in zip(expect_zones, waiters):
+                    if waiter in self._waiters.get(zone, []):
+                        self._waiters[zone].remove(waiter)
+
+            return None
+
+        def _reply_timeout(self, timeout):
+            """
+            :param timeout: number of seconds requested by the caller or None
+            :return: number of seconds to wait for a reply
+            """
+            if timeout is not None:
+                return timeout
+            if self._rtt is not None:
+                return self._rtt.timeout()
+            return TIMEOUT
+
+        def _add_rtt_sample(self, rtt: float):
+            if self._rtt is not None:
+                self._rtt.add_sample(rtt)
+
+        def _count(self, counter: str, amount=1):
+            if self._metrics is not None:
+                self._metrics.increment(counter, amount)
+
+        def _lock_acquired(self, start: float):
+            """
+            :param start: time.perf_counter() before the lock was requested
+            """
+            if self._metrics is not None:
+                self._metrics.observe_lock_wait(time.perf_counter() - start)
+
+        async def _send_command(self, request: bytes, timeout=None):
+            """
+            :param request: set command sent to the WS66i
+            :param timeout: number of seconds to wait for the connection to
+            be free, None to wait as long as it takes
+            """
+            batch = _AsyncBatch.find(self)
+            if batch is not None:
+                _collect(batch.commands, request)
+                return
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(lock.acquire(), timeout)
+            except asyncio.TimeoutError:
+                _LOGGER.error('Timed-Out waiting to send "%s"', request)
+                return
+            self._lock_acquired(start)
+            try:
+                await self._process_request(request)
+            finally:
+                lock.release()
+
+        async def _check_connection(self):
+            """
+            :return: True if the connection is usable for a status request
+            """
+            # Check if stream is open before reading zone status
+            # Did the caller called open first?
+            if not self._connected:
+                _LOGGER.debug('Connection needed first')
+                return False
+
+            if self._writer is None or self._writer.is_closing():
+                # The connection should be established, but an error was
+                # encountered (most likely amp was turned off)
+                # Attempt to re-establish the connection.
+                self._count("reconnect_attempts")
+                try:
+                    await self.open()
+                except ConnectionError:
+                    return False
+                self._count("reconnects")
+
+            return True
+
+        def _absent(self, zone: int) -> bool:
+            """
+            :return: True if the topology is known and lacks the controller
+            of the zone
+            """
+            return self._controllers is not None and zone // 10 not in self._controllers
+
+        async def topology(self):
+            return list(self._controllers) if self._controllers is not None else None
+
+        @locked_coro
+        async def probe_topology(self, timeout=None):
+            if not await self._check_connection():
+                return None
+
+            # Missing expanders don't reply. That is expected here, so their
+            # timeouts must not back off the adaptive timeout.
+            timeout = self._reply_timeout(timeout)
+            controllers = []
+            for controller in CONTROLLERS:
+                statuses = await self._process_request_zones(
+                    format_controller_status_request(controller), controller_zones(controller), timeout
+                )
+                if statuses is None:
+                    if controller == 1:
+                        # Amp is most likely turned off. Close the connection.
+                        self._close_stream()
+                        return None
+                    continue
+                controllers.append(controller)
+
+            _LOGGER.debug('Found controllers %s', controllers)
+            self._controllers = tuple(controllers)
+            return controllers
+
+        @locked_coro
+        async def zone_status(self, zone: int, timeout=None):
+            return await self._zone_status(zone, timeout)
+
+        async def _zone_status(self, zone: int, timeout=None):
+            if self._absent(zone) or not await self._check_connection():
+                return None
+
+            zone_status = await self._process_request(format_zone_status_request(zone), zone, timeout)
+            if zone_status is None:
+                # Amp is most likely turned off. Close the connection.
+                # Future calls to zone_status will try to reconnect.
+                self._close_stream()
+
+            return zone_status
+
+        @locked_coro
+        async def controller_status(self, controller: int, timeout=None):
+            if self._absent(controller * 10 + 1) or not await self._check_connection():
+                return None
+
+            statuses = await self._process_request_zones(
+                format_controller_status_request(controller), controller_zones(controller), timeout
+            )
+            if statuses is None:
+                # Amp is most likely turned off. Close the connection.
+                # Future calls will try to reconnect.
+                self._close_stream()
+                return None
+
+            return statuses
+
+        @locked_coro
+        async def zone_statuses(self, zones, timeout=None):
+            return await self._zone_statuses(zones, timeout)
+
+        async def _zone_statuses(self, zones, timeout=None):
+            zones = [zone for zone in zones if not self._absent(zone)]
+            if not await self._check_connection():
+                return None
+
+            # Each zone is requested once, replies are matched by zone
+            missing = list(dict.fromkeys(zones))
+            request = b"".join(format_zone_status_request(zone) for zone in missing)
+            replies = await self._process_request_zones(request, missing, timeout)
+            if replies is None:
+                # Amp is most likely turned off. Close the connection.
+                # Future calls will try to reconnect.
+                self._close_stream()
+                return None
+
+            statuses = dict(zip(missing, replies))
+            return [statuses[zone] for zone in zones]
+
+        async def set_power(self, zone: int, power: bool, timeout=None):
+            await self._send_command(format_set_power(zone, power), timeout)
+
+        async def set_mute(self, zone: int, mute: bool, timeout=None):
+            await self._send_command(format_set_mute(zone, mute), timeout)
+
+        async def set_volume(self, zone: int, volume: int, timeout=None):
+            await self._send_command(format_set_volume(zone, volume), timeout)
+
+        async def set_treble(self, zone: int, treble: int, timeout=None):
+            await self._send_command(format_set_treble(zone, treble), timeout)
+
+        async def set_bass(self, zone: int, bass: int, timeout=None):
+            await self._send_command(format_set_bass(zone, bass), timeout)
+
+        async def set_balance(self, zone: int, balance: int, timeout=None):
+            await self._send_command(format_set_balance(zone, balance), timeout)
+
+        async def set_source(self, zone: int, source: int, timeout=None):
+            await self._send_command(format_set_source(zone, source), timeout)
+
+        @asynccontextmanager
+        async def batch(self):
+            if _AsyncBatch.find(self) is not None:
+                # Nested, the outer batch sends everything
+                yield
+                return
+
+            batch = _AsyncBatch(self, asyncio.current_task(), _async_batch.get())
+            token = _async_batch.set(batch)
+            try:
+                yield
+            finally:
+                batch.open = False
+                _async_batch.reset(token)
+
+            if batch.commands:
+                await self._send_command(b"".join(batch.commands.values()))
+
+        @locked_coro
+        async def restore_zone(self, status: ZoneStatus):
+            # asyncio.Lock is not reentrant, so zone_status can't be called here
+            current = await self._zone_status(status.zone)
+            if current is None:
+                _LOGGER.error('Zone "%s" could not be restored, its state is unknown', status.zone)
+                return
+
+            request = _format_restore_zone(status, current)
+            if request:
+                await self._process_request(request)
+
+        async def capture_scene(self, name: str, zones, timeout=None):
+            statuses = await self.zone_statuses(zones, timeout)
+            if statuses is None:
+                return None
+            return Scene(name, statuses)
+
+        @locked_coro
+        async def apply_scene(self, scene):
+            current = await self._zone_statuses(scene.zones)
+            if current is None:
+                _LOGGER.error('Scene "%s" could not be applied, the state of its zones is unknown', scene.name)
+                return
+
+            request = _format_apply_scene(scene, current)
+            if request:
+                await self._process_request(request)
+
+    return WS66iAsync(host_name, host_port, rtt_estimator, topology, metrics)
+
+
+# These build on get_ws66i, so they are imported once it is defined
+from .capture import ReplayTransport, WireCapture, replay  # noqa: E402
+from .manager import WS66iManager  # noqa: E402
+from .scene import Scene, SceneStore  # noqa: E402
@@ -0,0 +1,125 @@
+"""
+Circuit breaker for the connection to the WS66i.
+
+While the amp is known to be down the breaker is open and requests fail
+immediately instead of waiting out a connect or read timeout each. The
+client probes for the amp in the background, with exponential backoff and
+jitter between attempts, and closes the breaker once it answers again.
+"""
+import logging
+import random
+from threading import Lock
+
+_LOGGER = logging.getLogger(__name__)
+
+STATE_CLOSED = "closed"  # Requests go through
+STATE_OPEN = "open"  # Requests fail immediately, waiting for the next probe
+STATE_HALF_OPEN = "half_open"  # A probe is trying to reach the amp
+
+
+class CircuitBreaker(object):
+    """
+    Tracks whether the WS66i is reachable
+    """
+
+    def __init__(self, failure_threshold=1, initial_delay=1.0, max_delay=60.0):
+        """
+        :param failure_threshold: number of consecutive failed requests that
+        open the breaker
+        :param initial_delay: number of seconds before the first probe
+        :param max_delay: maximum number of seconds between probes
+        """
+        self._failure_threshold = failure_threshold
+        self._initial_delay = initial_delay
+        self._max_delay = max_delay
+        self._lock = Lock()
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._probes = 0
+        self._listeners = []
+
+    @property
+    def state(self) -> str:
+        """
+        :return: STATE_CLOSED, STATE_OPEN or STATE_HALF_OPEN
+        """
+        return self._state
+
+    def allow(self) -> bool:
+        """
+        :return: True if requests may be sent to the WS66i
+        """
+        return self._state == STATE_CLOSED
+
+    def add_listener(self, callback):
+        """
+        :param callback: callable taking the new state, called on every
+        state change from the thread that caused it
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        self._listeners.remove(callback)
+
+    def next_delay(self) -> float:
+        """
+        :return: number of seconds to wait before the next probe. The delay
+        doubles with each failed probe up to max_delay, and a random part of
+        up to half of it spreads out probes of several clients.
+        """
+        delay = min(self._max_delay, self._initial_delay * 2 ** self._probes)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probes = 0
+            changed = self._set_state(STATE_CLOSED)
+        self._notify(changed)
+
+    def record_failure(self) -> bool:
+        """
+        :return: True if the failure opened the breaker, in which case the
+        caller starts probing
+        """
+        with self._lock:
+            if self._state == STATE_HALF_OPEN:
+                self._probes += 1
+                changed = self._set_state(STATE_OPEN)
+                opened = False
+            else:
+                self._failures += 1
+                opened = self._state == STATE_CLOSED and self._failures >= self._failure_threshold
+                changed = self._set_state(STATE_OPEN) if opened else None
+        self._notify(changed)
+        return opened
+
+    def start_probe(self):
+        with self._lock:
+            changed = self._set_state(STATE_HALF_OPEN)
+        self._notify(changed)
+
+    def reset(self):
+        """
+        Close the breaker and forget previous failures
+        """
+        self.record_success()
+
+    def _set_state(self, state: str):
+        """
+        :return: the new state if it changed, otherwise None
+        """
+        if self._state == state:
+            return None
+        self._state = state
+        return state
+
+    def _notify(self, state):
+        if state is None:
+            return
+        _LOGGER.debug('Circuit breaker is %s', state)
+        for callback in list(self._listeners):
+            try:
+                callback(state)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception('Error in circuit breaker listener')
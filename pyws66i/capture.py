@@ -0,0 +1,188 @@
+"""
+Capture of the raw traffic with the WS66i and offline replay of it.
+
+A WireCapture passed to a client keeps the most recent bytes sent and
+received in a bounded ring buffer and can dump them to a file. replay()
+runs a client against a capture instead of an amp, so a failure recorded
+in the field can be reproduced and profiled offline.
+"""
+import json
+import logging
+import time
+from collections import deque
+from threading import Lock
+
+from . import ZoneStatus, get_ws66i
+from .codec import decode_set_commands
+from .transport import RECEIVED, SENT, SocketTransport
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class WireCapture(object):
+    """
+    Ring buffer of timestamped chunks of traffic
+    """
+
+    def __init__(self, max_records=1000):
+        """
+        :param max_records: number of chunks kept, older ones are dropped
+        """
+        self._lock = Lock()
+        self._records = deque(maxlen=max_records)
+
+    def record(self, direction: str, data: bytes):
+        """
+        :param direction: SENT or RECEIVED
+        :param data: raw bytes
+        """
+        if data:
+            with self._lock:
+                self._records.append((time.time(), direction, bytes(data)))
+
+    def records(self):
+        """
+        :return: list of (time.time(), direction, bytes) tuples, oldest first
+        """
+        with self._lock:
+            return list(self._records)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def dump(self, path: str):
+        """
+        Write the records to a file, one JSON object per line. Bytes are
+        stored as latin-1 text so the file stays readable.
+        :param path: file to write
+        """
+        with open(path, "w") as file:
+            for timestamp, direction, data in self.records():
+                file.write(
+                    json.dumps({"time": timestamp, "direction": direction, "data": data.decode("latin-1")}) + "\n"
+                )
+
+    @staticmethod
+    def load(path: str):
+        """
+        :param path: file written by dump
+        :return: list of records like records()
+        """
+        with open(path) as file:
+            entries = [json.loads(line) for line in file if line.strip()]
+        return [(entry["time"], entry["direction"], entry["data"].encode("latin-1")) for entry in entries]
+
+
+class ReplayTransport(SocketTransport):
+    """
+    Transport playing back a capture. The bytes received after a request
+    are handed out once the client has sent that request, so the client
+    sees the replies in the order they were captured. Reads never block.
+    """
+
+    def __init__(self, records):
+        """
+        :param records: list of records as returned by WireCapture.records
+        """
+        super().__init__()
+        # Requests, each with the chunks received until the next request
+        self._exchanges = deque()
+        for _, direction, data in records:
+            if direction == SENT:
+                self._exchanges.append((data, []))
+            elif self._exchanges:
+                self._exchanges[-1][1].append(data)
+        self._requests = [request for request, _ in self._exchanges]
+        self._sent = b""
+        self._received = deque()
+        self._open = False
+        self.mismatches = 0
+
+    def requests(self):
+        """
+        :return: list of the captured requests in the order they were sent
+        """
+        return list(self._requests)
+
+    def open(self, host_name: str, host_port: int, timeout: float):
+        self._open = True
+
+    def close(self):
+        self._open = False
+        self._buffer.clear()
+
+    def is_open(self) -> bool:
+        return self._open
+
+    def write(self, data: bytes):
+        if not self._open:
+            raise BrokenPipeError("Connection is closed")
+        self.bytes_sent += len(data)
+        self._sent += data
+        # A captured request may have been sent in several writes, or several in one
+        while self._exchanges and len(self._sent) >= len(self._exchanges[0][0]):
+            request, replies = self._exchanges.popleft()
+            sent, self._sent = self._sent[:len(request)], self._sent[len(request):]
+            if sent != request:
+                self.mismatches += 1
+                _LOGGER.warning('Replay sent "%s" where the capture has "%s"', sent, request)
+            self._received.extend(replies)
+
+    def _receive(self, timeout: float) -> bool:
+        if not self._open:
+            raise EOFError
+        if not self._received:
+            return False
+        data = self._received.popleft()
+        self.bytes_received += len(data)
+        self._buffer += data
+        return True
+
+
+def _replay_request(ws66i, request: bytes):
+    """
+    Make the public call that sends request
+    :return: result of the call
+    """
+    queries = [command for command in request.split(b"\r") if command.startswith(b"?")]
+    if len(queries) > 1:
+        return ws66i.zone_statuses([int(query[1:]) for query in queries])
+    if queries:
+        zone = int(queries[0][1:])
+        if zone % 10 == 0:
+            return ws66i.controller_status(zone // 10)
+        return ws66i.zone_status(zone)
+    for zone, field, value in decode_set_commands(request):
+        getattr(ws66i, "set_" + field)(zone, value)
+    return None
+
+
+def replay(records):
+    """
+    Send every captured request again through a synchronous client that
+    reads the captured replies
+    :param records: list of records as returned by WireCapture.records or
+    WireCapture.load
+    :return: list of (request, result) tuples, where result is what the
+    client returned for the request, i.e. a ZoneStatus or None on a lost
+    reply
+    """
+    transport = ReplayTransport(records)
+    ws66i = get_ws66i("replay", transport=transport)
+    ws66i.open()
+    try:
+        results = [(request, _replay_request(ws66i, request)) for request in transport.requests()]
+    finally:
+        ws66i.close()
+    return results
+
+
+def undecodable_lines(records):
+    """
+    :param records: list of records as returned by WireCapture.records
+    :return: list of received lines that contain a zone status marker but
+    don't decode as a zone status, a sign of corrupted or interleaved data
+    """
+    data = b"".join(chunk for _, direction, chunk in records if direction == RECEIVED)
+    return [line for line in data.split(b"\n") if b"#>" in line and ZoneStatus.from_line(line) is None]
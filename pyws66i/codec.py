@@ -0,0 +1,181 @@
+"""
+Encoding of WS66i commands and decoding of its zone status replies.
+
+Set commands for every zone, attribute and value are built once at import
+and looked up by index. Zone status lines are decoded straight from the
+received bytes without going through a regular expression.
+"""
+import re
+from functools import lru_cache
+
+# The main amp (1) and both expanders (2, 3)
+CONTROLLERS = (1, 2, 3)
+
+# Zones of the main amp (11..16) and both expanders (21..26, 31..36)
+ZONES = tuple(controller * 10 + zone for controller in CONTROLLERS for zone in range(1, 7))
+
+# Attribute code: (ZoneStatus field, lowest value, highest value)
+ATTRIBUTES = {
+    b"PR": ("power", 0, 1),
+    b"MU": ("mute", 0, 1),
+    b"VO": ("volume", 0, 38),
+    b"TR": ("treble", 0, 14),
+    b"BS": ("bass", 0, 14),
+    b"BL": ("balance", 0, 20),
+    b"CH": ("source", 1, 6),
+}
+
+# Fields of a zone status line, in the order the WS66i sends them
+ZONE_STATUS_FIELDS = (
+    "zone",
+    "pa",
+    "power",
+    "mute",
+    "do_not_disturb",
+    "volume",
+    "treble",
+    "bass",
+    "balance",
+    "source",
+    "keypad",
+)
+
+_ZONE_STATUS_MARKER = b"#>"
+_ZONE_STATUS_LENGTH = 2 * len(ZONE_STATUS_FIELDS)
+
+
+def _build_command(zone: int, code: bytes, value: int) -> bytes:
+    return b"<%d%s%02d\r" % (zone, code, value)
+
+
+# (zone, attribute code) -> set command indexed by value
+_COMMANDS = {
+    (zone, code): tuple(_build_command(zone, code, value) for value in range(high + 1))
+    for zone in ZONES
+    for code, (_, _, high) in ATTRIBUTES.items()
+}
+
+_STATUS_REQUESTS = {zone: b"?%d\r" % zone for zone in ZONES + tuple(controller * 10 for controller in CONTROLLERS)}
+
+
+def _encode(zone: int, code: bytes, value: int) -> bytes:
+    _, low, high = ATTRIBUTES[code]
+    value = int(max(low, min(value, high)))
+    commands = _COMMANDS.get((zone, code))
+    if commands is None:
+        return _build_command(zone, code, value)
+    return commands[value]
+
+
+def format_zone_status_request(zone: int) -> bytes:
+    request = _STATUS_REQUESTS.get(zone)
+    if request is None:
+        return b"?%d\r" % zone
+    return request
+
+
+def format_controller_status_request(controller: int) -> bytes:
+    return format_zone_status_request(controller * 10)
+
+
+def controller_zones(controller: int):
+    return range(controller * 10 + 1, controller * 10 + 7)
+
+
+def format_set_power(zone: int, power: bool) -> bytes:
+    return _encode(zone, b"PR", 1 if power else 0)
+
+
+def format_set_mute(zone: int, mute: bool) -> bytes:
+    return _encode(zone, b"MU", 1 if mute else 0)
+
+
+def format_set_volume(zone: int, volume: int) -> bytes:
+    return _encode(zone, b"VO", volume)
+
+
+def format_set_treble(zone: int, treble: int) -> bytes:
+    return _encode(zone, b"TR", treble)
+
+
+def format_set_bass(zone: int, bass: int) -> bytes:
+    return _encode(zone, b"BS", bass)
+
+
+def format_set_balance(zone: int, balance: int) -> bytes:
+    return _encode(zone, b"BL", balance)
+
+
+def format_set_source(zone: int, source: int) -> bytes:
+    return _encode(zone, b"CH", source)
+
+
+def decode_set_commands(request: bytes):
+    """
+    Decode set commands, i.e. b"<11VO20\\r<11MU01\\r"
+    :param request: one or more set commands
+    :return: generator of (zone, ZoneStatus field, value) tuples. Anything
+    that isn't a set command is skipped.
+    """
+    for command in request.split(b"\r"):
+        attribute = ATTRIBUTES.get(command[3:5])
+        if attribute is None or len(command) != 7 or not command[1:3].isdigit() or not command[5:7].isdigit():
+            continue
+        yield int(command[1:3]), attribute[0], int(command[5:7])
+
+
+@lru_cache(maxsize=None)
+def zone_pattern(zone: int):
+    """
+    :param zone: zone 11..16, 21..26, 31..36
+    :return: compiled regex matching the status line of the zone
+    """
+    return re.compile(b"(%d)" % zone + rb"(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)")
+
+
+def decode_zone_status(data, start=0):
+    """
+    Decode the digits of a zone status
+    :param data: bytes, bytearray or memoryview
+    :param start: offset of the first digit of the zone number
+    :return: tuple of the eleven fields in ZONE_STATUS_FIELDS order or None
+    """
+    c = bytes(data[start:start + _ZONE_STATUS_LENGTH])
+    if len(c) != _ZONE_STATUS_LENGTH or not c.isdigit():
+        return None
+    # Unrolled on purpose, this is several times faster than a loop
+    return (
+        (c[0] - 48) * 10 + c[1] - 48,
+        (c[2] - 48) * 10 + c[3] - 48,
+        (c[4] - 48) * 10 + c[5] - 48,
+        (c[6] - 48) * 10 + c[7] - 48,
+        (c[8] - 48) * 10 + c[9] - 48,
+        (c[10] - 48) * 10 + c[11] - 48,
+        (c[12] - 48) * 10 + c[13] - 48,
+        (c[14] - 48) * 10 + c[15] - 48,
+        (c[16] - 48) * 10 + c[17] - 48,
+        (c[18] - 48) * 10 + c[19] - 48,
+        (c[20] - 48) * 10 + c[21] - 48,
+    )
+
+
+def encode_zone_status(fields) -> bytes:
+    """
+    Encode the digits of a zone status, the reverse of decode_zone_status
+    :param fields: the eleven fields in ZONE_STATUS_FIELDS order
+    :return: 22 digits, i.e. b"1100010000131112100401"
+    """
+    return b"%02d%02d%02d%02d%02d%02d%02d%02d%02d%02d%02d" % tuple(int(field) for field in fields)
+
+
+def parse_zone_status_line(line):
+    """
+    Decode a line received from the WS66i
+    :param line: bytes, bytearray or memoryview, i.e. b"#>1100010000131112100401\\r\\r\\n"
+    :return: tuple of the eleven fields in ZONE_STATUS_FIELDS order or None
+    if the line isn't a zone status
+    """
+    start = bytes(line).find(_ZONE_STATUS_MARKER)
+    if start < 0:
+        return None
+    return decode_zone_status(line, start + len(_ZONE_STATUS_MARKER))
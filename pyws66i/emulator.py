@@ -0,0 +1,254 @@
+"""
+Emulator of the WS66i telnet protocol on a local TCP port.
+
+Answers zone and controller status requests, applies set commands and
+pushes unsolicited zone status lines like a keypad would. Latency, jitter,
+dropped replies and the amp being turned off can be configured, so the
+clients can be tested and benchmarked against real socket I/O.
+"""
+import random
+import selectors
+import socket
+from threading import Event, Lock, Thread
+
+from .codec import (
+    ATTRIBUTES,
+    CONTROLLERS,
+    ZONE_STATUS_FIELDS,
+    controller_zones,
+    decode_set_commands,
+    encode_zone_status,
+)
+
+ACCEPT_INTERVAL = 0.05  # Number of seconds the emulator blocks on accept
+
+# Status of a zone after power on, in ZONE_STATUS_FIELDS order
+_DEFAULT_STATUS = dict(
+    pa=0, power=0, mute=0, do_not_disturb=0, volume=20, treble=7, bass=7, balance=10, source=1, keypad=1
+)
+
+
+class WS66iEmulator(object):
+    """
+    TCP server behaving like a WS66i. Use as a context manager or call
+    start() and stop().
+    """
+
+    def __init__(
+        self,
+        host_name="127.0.0.1",
+        host_port=0,
+        controllers=(1,),
+        latency=0.0,
+        jitter=0.0,
+        drop_rate=0.0,
+        seed=None,
+    ):
+        """
+        :param host_name: address to listen on
+        :param host_port: port to listen on, 0 picks a free one
+        :param controllers: connected controllers, 1 for the main amp and
+        2..3 for expanders. Requests for other controllers get no reply.
+        :param latency: number of seconds before each reply
+        :param jitter: maximum number of seconds added to or taken from the
+        latency at random
+        :param drop_rate: probability from 0 to 1 that a reply is not sent
+        :param seed: seed of the random jitter and drops
+        """
+        self.host_name = host_name
+        self.host_port = host_port
+        self.controllers = tuple(controllers)
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.commands_received = 0
+        self._random = random.Random(seed)
+        self._lock = Lock()
+        self._zones = {
+            zone: dict(zone=zone, **_DEFAULT_STATUS)
+            for controller in CONTROLLERS
+            for zone in controller_zones(controller)
+        }
+        # Open connections mapped to the lock serializing writes to them
+        self._connections = {}
+        self._server = None
+        self._stop = None
+        self._acceptor = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def powered(self) -> bool:
+        return self._server is not None
+
+    def start(self):
+        """
+        Start listening. The port picked the first time is kept, so clients
+        can reconnect after power_off() and power_on().
+        """
+        if self._server is not None:
+            return
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((self.host_name, self.host_port))
+        server.listen()
+        self.host_port = server.getsockname()[1]
+        self._server = server
+        self._stop = Event()
+        self._acceptor = Thread(
+            target=self._accept, args=(server, self._stop), name="ws66i-emulator", daemon=True
+        )
+        self._acceptor.start()
+
+    def stop(self):
+        """
+        Stop listening and close every connection
+        """
+        if self._server is None:
+            return
+        self._stop.set()
+        self._acceptor.join()
+        self._server.close()
+        self._server = None
+        with self._lock:
+            connections = list(self._connections)
+        for conn in connections:
+            self._disconnect(conn)
+
+    def power_off(self):
+        """
+        Behave like the amp was turned off. Connections are closed and new
+        ones refused until power_on().
+        """
+        self.stop()
+
+    def power_on(self):
+        self.start()
+
+    def zone(self, zone: int):
+        """
+        :param zone: zone 11..16, 21..26, 31..36
+        :return: dict of the current fields of the zone, keyed like ZoneStatus
+        """
+        with self._lock:
+            return dict(self._zones[zone])
+
+    def keypad_update(self, zone: int, **fields):
+        """
+        Change a zone like its keypad would. The new status is sent to every
+        connected client unsolicited.
+        :param zone: zone 11..16, 21..26, 31..36
+        :param fields: ZoneStatus fields to change, i.e. volume=12
+        """
+        with self._lock:
+            self._zones[zone].update(fields)
+            line = self._format_status(zone)
+            connections = list(self._connections)
+        for conn in connections:
+            self._send(conn, line)
+
+    def _accept(self, server, stop: Event):
+        with selectors.DefaultSelector() as selector:
+            selector.register(server, selectors.EVENT_READ)
+            while not stop.is_set():
+                if selector.select(ACCEPT_INTERVAL):
+                    self._accept_connection(server)
+
+    def _accept_connection(self, server):
+        try:
+            conn, _ = server.accept()
+        except OSError:
+            return
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self._lock:
+            self._connections[conn] = Lock()
+        Thread(target=self._serve, args=(conn,), name="ws66i-emulator-conn", daemon=True).start()
+
+    def _serve(self, conn):
+        """
+        Body of the thread of a connection. Commands are handled one after
+        the other, like the amp does.
+        """
+        buffer = b""
+        try:
+            while True:
+                data = conn.recv(1024)
+                if not data:
+                    break
+                buffer += data
+                *commands, buffer = buffer.split(b"\r")
+                for command in commands:
+                    reply = self._handle(command.strip())
+                    if reply is None or self._dropped():
+                        continue
+                    delay = self._delay()
+                    if delay > 0 and self._stop.wait(delay):
+                        return
+                    self._send(conn, reply)
+        except OSError:
+            pass
+        finally:
+            self._disconnect(conn)
+
+    def _handle(self, command: bytes):
+        """
+        :param command: command without the trailing carriage return
+        :return: bytes to reply with or None
+        """
+        with self._lock:
+            self.commands_received += 1
+            if command.startswith(b"?") and command[1:].isdigit():
+                zone = int(command[1:])
+                if zone // 10 not in self.controllers:
+                    return None
+                if zone % 10 == 0:
+                    return b"".join(self._format_status(zone) for zone in controller_zones(zone // 10))
+                if zone in self._zones:
+                    return self._format_status(zone)
+                return None
+
+            if command.startswith(b"<") and command[3:5] in ATTRIBUTES:
+                for zone, field, value in decode_set_commands(command + b"\r"):
+                    _, low, high = ATTRIBUTES[command[3:5]]
+                    if zone // 10 in self.controllers and zone in self._zones:
+                        self._zones[zone][field] = max(low, min(value, high))
+                return b"\r\n#"
+            return None
+
+    def _format_status(self, zone: int) -> bytes:
+        status = self._zones[zone]
+        return b"\r\n#>" + encode_zone_status(status[field] for field in ZONE_STATUS_FIELDS) + b"\r\r\n#"
+
+    def _dropped(self) -> bool:
+        return self.drop_rate > 0 and self._random.random() < self.drop_rate
+
+    def _delay(self) -> float:
+        if not self.jitter:
+            return self.latency
+        return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def _send(self, conn, data: bytes):
+        with self._lock:
+            send_lock = self._connections.get(conn)
+        if send_lock is None:
+            return
+        try:
+            with send_lock:
+                conn.sendall(data)
+        except OSError:
+            self._disconnect(conn)
+
+    def _disconnect(self, conn):
+        with self._lock:
+            if self._connections.pop(conn, None) is None:
+                return
+        try:
+            conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        conn.close()
@@ -0,0 +1,133 @@
+"""
+Zone groups: several zones driven as one.
+
+Every call on a group sets all of its zones within a single batch, so the
+amp receives one write and the zones change together. A group can give
+each zone a volume offset, and step_volume moves every zone by the same
+amount, so the levels of the zones stay relative to each other.
+"""
+from .codec import ATTRIBUTES
+
+_, MIN_VOLUME, MAX_VOLUME = ATTRIBUTES[b"VO"]
+
+
+class ZoneGroup(object):
+    """
+    Zones of a synchronous client driven as one
+    """
+
+    def __init__(self, ws66i, zones, name=None, offsets=None):
+        """
+        :param ws66i: client returned by get_ws66i
+        :param zones: list of zones 11..16, 21..26, 31..36
+        :param name: name of the group, i.e. "downstairs"
+        :param offsets: dict mapping zones to the number of steps added to
+        the volume set on the group, i.e. {21: -5} for a zone playing
+        quieter than the others. Zones not listed have no offset.
+        """
+        self.ws66i = ws66i
+        self.zones = list(dict.fromkeys(zones))
+        self.name = name
+        self.offsets = dict(offsets or {})
+
+    def set_power(self, power: bool):
+        with self.ws66i.batch():
+            for zone in self.zones:
+                self.ws66i.set_power(zone, power)
+
+    def set_mute(self, mute: bool):
+        with self.ws66i.batch():
+            for zone in self.zones:
+                self.ws66i.set_mute(zone, mute)
+
+    def set_source(self, source: int):
+        with self.ws66i.batch():
+            for zone in self.zones:
+                self.ws66i.set_source(zone, source)
+
+    def set_volume(self, volume: int):
+        """
+        :param volume: volume of the zones without offset, the volume of
+        every zone is kept between 0 and 38
+        """
+        with self.ws66i.batch():
+            for zone, zone_volume in self._volumes(volume).items():
+                self.ws66i.set_volume(zone, zone_volume)
+
+    def step_volume(self, steps: int):
+        """
+        Move the volume of every zone by the same number of steps from its
+        current volume. The steps are reduced so that no zone goes past 0
+        or 38, which would change its level relative to the others.
+        :param steps: positive to raise the volume, negative to lower it
+        :return: number of steps taken, None if the current volumes are unknown
+        """
+        statuses = self.ws66i.zone_statuses(self.zones)
+        if statuses is None:
+            return None
+        volumes, steps = _step(statuses, steps)
+        if volumes:
+            with self.ws66i.batch():
+                for zone, volume in volumes.items():
+                    self.ws66i.set_volume(zone, volume)
+        return steps
+
+    def _volumes(self, volume: int):
+        return {
+            zone: max(MIN_VOLUME, min(volume + self.offsets.get(zone, 0), MAX_VOLUME)) for zone in self.zones
+        }
+
+
+class AsyncZoneGroup(ZoneGroup):
+    """
+    Zones of an asyncio client driven as one. Every method is a coroutine.
+    """
+
+    async def set_power(self, power: bool):
+        async with self.ws66i.batch():
+            for zone in self.zones:
+                await self.ws66i.set_power(zone, power)
+
+    async def set_mute(self, mute: bool):
+        async with self.ws66i.batch():
+            for zone in self.zones:
+                await self.ws66i.set_mute(zone, mute)
+
+    async def set_source(self, source: int):
+        async with self.ws66i.batch():
+            for zone in self.zones:
+                await self.ws66i.set_source(zone, source)
+
+    async def set_volume(self, volume: int):
+        async with self.ws66i.batch():
+            for zone, zone_volume in self._volumes(volume).items():
+                await self.ws66i.set_volume(zone, zone_volume)
+
+    async def step_volume(self, steps: int):
+        statuses = await self.ws66i.zone_statuses(self.zones)
+        if statuses is None:
+            return None
+        volumes, steps = _step(statuses, steps)
+        if volumes:
+            async with self.ws66i.batch():
+                for zone, volume in volumes.items():
+                    await self.ws66i.set_volume(zone, volume)
+        return steps
+
+
+def _step(statuses, steps: int):
+    """
+    :param statuses: current statuses of the zones of a group
+    :param steps: number of volume steps asked for
+    :return: dict of the new volume of each zone and the number of steps
+    taken, limited by the loudest or quietest zone
+    """
+    if not statuses:
+        return {}, 0
+    if steps > 0:
+        steps = min(steps, MAX_VOLUME - max(status.volume for status in statuses))
+    else:
+        steps = max(steps, MIN_VOLUME - min(status.volume for status in statuses))
+    if not steps:
+        return {}, 0
+    return {status.zone: status.volume + steps for status in statuses}, steps
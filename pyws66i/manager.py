@@ -0,0 +1,151 @@
+"""
+Manager of several WS66i amplifiers.
+
+Each host gets its own synchronous client and the clients are refreshed
+concurrently on a thread pool, so an amplifier that is turned off only
+delays its own zones instead of every other host's.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from threading import Lock
+
+from . import get_ws66i
+from .codec import controller_zones
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class WS66iManager(object):
+    """
+    Holds one client per host and keeps a combined view of their zones
+    keyed by (host, zone)
+    """
+
+    def __init__(self, hosts, zones=None, factory=None, max_workers=None):
+        """
+        :param hosts: host names, i.e. ['192.168.1.123', '192.168.1.124']
+        :param zones: list of zones refreshed on every host. Defaults to the
+        six zones of the main amp.
+        :param factory: callable taking a host name and returning a WS66i
+        client. Defaults to get_ws66i, use functools.partial to pass options.
+        :param max_workers: number of hosts refreshed at the same time.
+        Defaults to one thread per host.
+        """
+        factory = factory if factory is not None else get_ws66i
+        self._zones = list(zones) if zones is not None else list(controller_zones(1))
+        self._clients = {host: factory(host) for host in hosts}
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or max(len(self._clients), 1), thread_name_prefix="ws66i-manager"
+        )
+        self._lock = Lock()
+        self._opened = set()
+        self._statuses = {}
+        self._latencies = {}
+        # Refresh of each host still running after a refresh timed out
+        self._refreshing = {}
+
+    @property
+    def hosts(self):
+        return list(self._clients)
+
+    def client(self, host: str):
+        """
+        :param host: one of the hosts passed to the manager
+        :return: WS66i client of the host
+        """
+        return self._clients[host]
+
+    def open(self):
+        """
+        Open the connection to every host concurrently. Hosts that can't be
+        reached are logged and opened again by the next refresh.
+        :return: list of hosts that were opened
+        """
+        futures = {self._executor.submit(self._open, host): host for host in self._clients}
+        wait(futures)
+        return [host for future, host in futures.items() if future.result()]
+
+    def _open(self, host: str) -> bool:
+        if host in self._opened:
+            return True
+        try:
+            self._clients[host].open()
+        except ConnectionError as error:
+            _LOGGER.error('Host "%s" could not be opened: %s', host, repr(error))
+            return False
+        with self._lock:
+            self._opened.add(host)
+        return True
+
+    def close(self):
+        """
+        Close every connection and stop the thread pool
+        """
+        for host, client in self._clients.items():
+            if host in self._opened:
+                client.close()
+        self._opened.clear()
+        self._executor.shutdown(wait=False)
+
+    def refresh(self, timeout=None):
+        """
+        Get the status of the zones of every host concurrently
+        :param timeout: number of seconds to wait for all hosts. Hosts that
+        haven't answered in time are left out of this refresh. None waits
+        for every host.
+        :return: dict of ZoneStatus keyed by (host, zone) for the hosts that
+        answered. Hosts whose client raised are logged and left out.
+        """
+        # A host still busy with an earlier refresh is not asked again, so
+        # it can't take up the threads of the other hosts
+        futures = {
+            self._refreshing.get(host) or self._executor.submit(self._refresh, host): host for host in self._clients
+        }
+        done, _ = wait(futures, timeout)
+        self._refreshing = {host: future for future, host in futures.items() if future not in done}
+
+        statuses = {}
+        with self._lock:
+            for future, host in futures.items():
+                for key in [key for key in self._statuses if key[0] == host]:
+                    del self._statuses[key]
+                if future not in done:
+                    _LOGGER.error('Host "%s" did not answer in time', host)
+                    self._latencies[host] = None
+                    continue
+                error = future.exception()
+                if error is not None:
+                    _LOGGER.error('Host "%s" failed to refresh: %s', host, repr(error))
+                    self._latencies[host] = None
+                    continue
+                host_statuses, self._latencies[host] = future.result()
+                for status in host_statuses or []:
+                    statuses[(host, status.zone)] = status
+            self._statuses.update(statuses)
+        return statuses
+
+    def _refresh(self, host: str):
+        """
+        :return: tuple of the statuses of the host or None, and the number
+        of seconds the refresh took
+        """
+        start = time.monotonic()
+        statuses = self._clients[host].zone_statuses(self._zones) if self._open(host) else None
+        return statuses, time.monotonic() - start
+
+    def statuses(self):
+        """
+        :return: dict of ZoneStatus keyed by (host, zone) as of the last
+        refresh
+        """
+        with self._lock:
+            return dict(self._statuses)
+
+    def latencies(self):
+        """
+        :return: dict of the number of seconds the last refresh of each host
+        took, keyed by host. None for hosts that didn't answer in time.
+        """
+        with self._lock:
+            return dict(self._latencies)
@@ -0,0 +1,166 @@
+"""
+Instrumentation of the WS66i clients.
+
+A Metrics instance passed to a client collects latency histograms per
+command type, counters of errors, reconnects and bytes, and the time calls
+wait for the connection: in the queue of the I/O worker of the synchronous
+client, split by priority, or for the lock of the asyncio client.
+snapshot() returns everything as plain dicts and an optional callback sees
+every value as it is recorded.
+"""
+import bisect
+import logging
+from threading import Lock
+
+from .codec import ATTRIBUTES
+
+_LOGGER = logging.getLogger(__name__)
+
+# Upper bounds in seconds of the histogram buckets, the last bucket is unbounded
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+COUNTERS = (
+    "timeouts",  # Replies that didn't arrive in time
+    "eof",  # Connection closed by the WS66i while waiting for a reply
+    "broken_pipe",  # Connection broken while sending
+    "errors",  # Any other failed request
+    "reconnect_attempts",
+    "reconnects",  # Successful reconnect attempts
+    "bytes_sent",
+    "bytes_received",
+)
+
+
+def command_name(request: bytes) -> str:
+    """
+    :param request: request sent to the WS66i, i.e. b"<11VO20\\r"
+    :return: type of the command, i.e. "set_volume"
+    """
+    if request.count(b"\r") > 1:
+        return "zone_statuses" if request.startswith(b"?") else "set_multiple"
+    if request.startswith(b"?"):
+        return "controller_status" if request[2:3] == b"0" else "zone_status"
+    attribute = ATTRIBUTES.get(request[3:5])
+    if attribute is None:
+        return "unknown"
+    return "set_" + attribute[0]
+
+
+class Histogram(object):
+    """
+    Distribution of durations over LATENCY_BUCKETS
+    """
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, seconds: float):
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def snapshot(self):
+        """
+        :return: dict with count, sum, min and max in seconds, and the
+        number of observations per bucket keyed by its upper bound
+        """
+        bounds = [str(bound) for bound in LATENCY_BUCKETS] + ["inf"]
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min,
+            "max": self.max,
+            "buckets": dict(zip(bounds, self.buckets)),
+        }
+
+
+class Metrics(object):
+    """
+    Collects the metrics of a client. One instance can be shared by
+    several clients to aggregate them.
+    """
+
+    def __init__(self, callback=None):
+        """
+        :param callback: callable taking a metric name and a value, called
+        for every recorded value from the thread that recorded it. Latencies
+        are named "latency.<command>", i.e. "latency.set_volume", queue
+        waits "queue_wait.<priority>" and counters by their name in COUNTERS.
+        """
+        self._callback = callback
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._latency = {}
+            self._lock_wait = Histogram()
+            self._queue_wait = {}
+            self._counters = dict.fromkeys(COUNTERS, 0)
+
+    def observe_latency(self, command: str, seconds: float):
+        """
+        :param command: type of the command, see command_name
+        :param seconds: time from sending the request to the last reply
+        """
+        with self._lock:
+            histogram = self._latency.get(command)
+            if histogram is None:
+                histogram = self._latency[command] = Histogram()
+            histogram.observe(seconds)
+        self._notify("latency." + command, seconds)
+
+    def observe_lock_wait(self, seconds: float, priority=None):
+        """
+        :param seconds: time the call waited for the connection
+        :param priority: priority the call was queued with, None if calls
+        are not queued by priority
+        """
+        with self._lock:
+            self._lock_wait.observe(seconds)
+            if priority is not None:
+                histogram = self._queue_wait.get(priority)
+                if histogram is None:
+                    histogram = self._queue_wait[priority] = Histogram()
+                histogram.observe(seconds)
+        self._notify("lock_wait", seconds)
+        if priority is not None:
+            self._notify("queue_wait." + priority, seconds)
+
+    def increment(self, counter: str, amount=1):
+        """
+        :param counter: one of COUNTERS
+        """
+        if not amount:
+            return
+        with self._lock:
+            self._counters[counter] += amount
+        self._notify(counter, amount)
+
+    def snapshot(self):
+        """
+        :return: dict with "latency" histograms keyed by command type,
+        the "lock_wait" histogram, "queue_wait" histograms keyed by
+        priority and the "counters"
+        """
+        with self._lock:
+            return {
+                "latency": {command: histogram.snapshot() for command, histogram in self._latency.items()},
+                "lock_wait": self._lock_wait.snapshot(),
+                "queue_wait": {priority: histogram.snapshot() for priority, histogram in self._queue_wait.items()},
+                "counters": dict(self._counters),
+            }
+
+    def _notify(self, name: str, value):
+        if self._callback is None:
+            return
+        try:
+            self._callback(name, value)
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception('Error in metrics callback')
@@ -0,0 +1,191 @@
+"""
+Adaptive polling of zone statuses.
+
+Instead of refreshing every zone at a fixed interval, AdaptivePoller gives
+each zone its own interval. A zone that changed is polled every
+active_interval seconds. Every poll that finds it unchanged doubles its
+interval, up to idle_interval while the zone is on and off_interval while
+it is off. The zones due at the same time are requested in a single
+zone_statuses call, which the synchronous client queues behind
+interactive calls.
+"""
+import logging
+import time
+from threading import Event, Lock, Thread
+
+from .codec import controller_zones
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class AdaptivePoller(object):
+    """
+    Background thread polling the zones of a synchronous client at rates
+    following their activity
+    """
+
+    def __init__(
+        self,
+        ws66i,
+        zones=None,
+        callback=None,
+        active_interval=1.0,
+        idle_interval=10.0,
+        off_interval=60.0,
+        backoff=2.0,
+    ):
+        """
+        :param ws66i: client returned by get_ws66i
+        :param zones: list of zones to poll. Defaults to the six zones of
+        the main amp.
+        :param callback: callable taking a ZoneStatus, called from the
+        poller thread for the first status of every zone and whenever a
+        zone changed
+        :param active_interval: number of seconds between polls of a zone
+        that just changed
+        :param idle_interval: longest number of seconds between polls of a
+        zone that is on
+        :param off_interval: longest number of seconds between polls of a
+        zone that is off, or of every zone while the WS66i doesn't answer
+        :param backoff: factor the interval of a zone grows by with every
+        poll that finds it unchanged
+        """
+        self._ws66i = ws66i
+        self._zones = list(zones) if zones is not None else list(controller_zones(1))
+        self._callback = callback
+        self._active_interval = active_interval
+        self._idle_interval = idle_interval
+        self._off_interval = off_interval
+        self._backoff = backoff
+        self._lock = Lock()
+        self._statuses = {}
+        now = time.monotonic()
+        # Current interval and time of the next poll of each zone
+        self._intervals = dict.fromkeys(self._zones, active_interval)
+        self._due = dict.fromkeys(self._zones, now)
+        self._thread = None
+        self._stop = None
+        self._wakeup = Event()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        """
+        Start polling in a background thread
+        """
+        if self._thread is not None:
+            return
+        self._stop = Event()
+        self._thread = Thread(target=self._run, args=(self._stop,), name="ws66i-poller", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+
+    def statuses(self):
+        """
+        :return: dict of the last status of each zone polled so far
+        """
+        with self._lock:
+            return dict(self._statuses)
+
+    def interval(self, zone: int) -> float:
+        """
+        :return: current number of seconds between polls of the zone
+        """
+        with self._lock:
+            return self._intervals[zone]
+
+    def wake(self, zones=None):
+        """
+        Poll zones right away and at the active rate again, i.e. after the
+        application changed them
+        :param zones: list of zones, None for every zone
+        """
+        now = time.monotonic()
+        with self._lock:
+            for zone in self._zones if zones is None else zones:
+                if zone in self._intervals:
+                    self._intervals[zone] = self._active_interval
+                    self._due[zone] = now
+        self._wakeup.set()
+
+    def poll(self):
+        """
+        Poll the zones that are due, in a single request
+        :return: list of the zones that changed, None if the WS66i didn't
+        answer
+        """
+        now = time.monotonic()
+        with self._lock:
+            due = [zone for zone in self._zones if self._due[zone] <= now]
+        if not due:
+            return []
+
+        statuses = self._ws66i.zone_statuses(due)
+        now = time.monotonic()
+        changed = []
+        with self._lock:
+            if statuses is None:
+                # Amp is most likely turned off, back off every zone asked for
+                for zone in due:
+                    self._reschedule(zone, self._off_interval, now)
+                return None
+
+            for status in statuses:
+                previous = self._statuses.get(status.zone)
+                self._statuses[status.zone] = status
+                if status != previous:
+                    changed.append(status)
+                    self._intervals[status.zone] = self._active_interval
+                    self._due[status.zone] = now + self._active_interval
+                else:
+                    self._reschedule(status.zone, self._idle_interval if status.power else self._off_interval, now)
+            # Zones the client left out, i.e. of absent expanders
+            for zone in set(due) - set(status.zone for status in statuses):
+                self._reschedule(zone, self._off_interval, now)
+
+        for status in changed:
+            self._notify(status)
+        return [status.zone for status in changed]
+
+    def _reschedule(self, zone: int, limit: float, now: float):
+        interval = self._intervals[zone] * self._backoff
+        self._intervals[zone] = interval = max(self._active_interval, min(interval, limit))
+        self._due[zone] = now + interval
+
+    def _delay(self) -> float:
+        """
+        :return: number of seconds until the next zone is due
+        """
+        with self._lock:
+            return max(0.0, min(self._due.values()) - time.monotonic()) if self._due else self._off_interval
+
+    def _run(self, stop: Event):
+        while not stop.is_set():
+            try:
+                self.poll()
+                delay = self._delay()
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception('Error polling zones')
+                delay = self._idle_interval
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+
+    def _notify(self, status):
+        if self._callback is None:
+            return
+        try:
+            self._callback(status)
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception('Error in poller callback')
@@ -0,0 +1,79 @@
+"""
+Round-trip time estimation for deriving reply timeouts.
+
+Follows the TCP retransmission timer of RFC 6298: a smoothed round-trip
+time (SRTT) and its variation (RTTVAR) are updated with every measured
+reply, and the timeout is SRTT + 4 * RTTVAR. The timeout doubles after each
+lost reply until a new measurement comes in.
+"""
+from threading import Lock
+
+INITIAL_TIMEOUT = 0.8  # Number of seconds used until a round trip is measured
+MIN_TIMEOUT = 0.1  # Lower bound of the timeout in seconds
+MAX_TIMEOUT = 3.0  # Upper bound of the timeout in seconds
+
+_ALPHA = 1 / 8  # Gain of SRTT
+_BETA = 1 / 4  # Gain of RTTVAR
+_K = 4  # Weight of RTTVAR in the timeout
+
+
+class RttEstimator(object):
+    """
+    Moving estimate of the round-trip time to a WS66i
+    """
+
+    def __init__(self, initial_timeout=INITIAL_TIMEOUT, min_timeout=MIN_TIMEOUT, max_timeout=MAX_TIMEOUT):
+        """
+        :param initial_timeout: number of seconds used until a round trip is measured
+        :param min_timeout: lower bound of the timeout in seconds
+        :param max_timeout: upper bound of the timeout in seconds
+        """
+        self._min_timeout = min_timeout
+        self._max_timeout = max_timeout
+        self._lock = Lock()
+        self._srtt = None
+        self._rttvar = None
+        self._timeout = self._clamp(initial_timeout)
+
+    @property
+    def srtt(self):
+        """
+        :return: smoothed round-trip time in seconds, None until measured
+        """
+        return self._srtt
+
+    @property
+    def rttvar(self):
+        """
+        :return: round-trip time variation in seconds, None until measured
+        """
+        return self._rttvar
+
+    def timeout(self) -> float:
+        """
+        :return: number of seconds to wait for a reply
+        """
+        return self._timeout
+
+    def add_sample(self, rtt: float):
+        """
+        :param rtt: measured number of seconds between a request and its reply
+        """
+        with self._lock:
+            if self._srtt is None:
+                self._srtt = rtt
+                self._rttvar = rtt / 2
+            else:
+                self._rttvar = (1 - _BETA) * self._rttvar + _BETA * abs(self._srtt - rtt)
+                self._srtt = (1 - _ALPHA) * self._srtt + _ALPHA * rtt
+            self._timeout = self._clamp(self._srtt + _K * self._rttvar)
+
+    def on_timeout(self):
+        """
+        A reply was lost, back off until the next measurement
+        """
+        with self._lock:
+            self._timeout = self._clamp(self._timeout * 2)
+
+    def _clamp(self, timeout: float) -> float:
+        return max(self._min_timeout, min(timeout, self._max_timeout))
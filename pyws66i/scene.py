@@ -0,0 +1,133 @@
+"""
+Named scenes: snapshots of several zones that can be applied later.
+
+A scene is captured from a client with capture_scene and applied with
+apply_scene, which sends only the attributes that differ from the current
+state of the zones, all in a single write. A SceneStore keeps scenes by
+name and serializes each of them as the 22 digits of its zone statuses
+put end to end, so a store loads without parsing anything but digits.
+"""
+import json
+from collections import namedtuple
+from threading import Lock
+
+from . import ZoneStatus
+
+_STATUS_LENGTH = 22  # Number of digits of an encoded zone status
+
+
+class Scene(namedtuple("Scene", ("name", "statuses"))):
+    """
+    Immutable named list of zone statuses
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, name: str, statuses):
+        return super().__new__(cls, name, tuple(statuses))
+
+    @property
+    def zones(self):
+        return [status.zone for status in self.statuses]
+
+    def to_bytes(self) -> bytes:
+        """
+        :return: the zone statuses of the scene encoded end to end
+        """
+        return b"".join(status.to_bytes() for status in self.statuses)
+
+    @classmethod
+    def from_bytes(cls, name: str, data: bytes):
+        """
+        :param name: name of the scene
+        :param data: zone statuses as returned by to_bytes
+        :return: Scene
+        :raise ValueError: if data doesn't decode as zone statuses
+        """
+        if len(data) % _STATUS_LENGTH:
+            raise ValueError("Scene {} has {} digits".format(name, len(data)))
+        statuses = []
+        for index in range(0, len(data), _STATUS_LENGTH):
+            status = ZoneStatus.from_bytes(data[index:index + _STATUS_LENGTH])
+            if status is None:
+                raise ValueError("Scene {} has an invalid zone status".format(name))
+            statuses.append(status)
+        return cls(name, statuses)
+
+
+class SceneStore(object):
+    """
+    Scenes keyed by name
+    """
+
+    def __init__(self, scenes=()):
+        """
+        :param scenes: scenes to start with
+        """
+        self._lock = Lock()
+        self._scenes = {scene.name: scene for scene in scenes}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._scenes
+
+    def __len__(self) -> int:
+        return len(self._scenes)
+
+    def names(self):
+        """
+        :return: list of the names of the scenes in the order they were added
+        """
+        with self._lock:
+            return list(self._scenes)
+
+    def get(self, name: str):
+        """
+        :return: Scene or None if there is no scene with that name
+        """
+        with self._lock:
+            return self._scenes.get(name)
+
+    def add(self, scene: Scene):
+        """
+        Store a scene, replacing the scene with the same name
+        """
+        with self._lock:
+            self._scenes[scene.name] = scene
+
+    def remove(self, name: str):
+        with self._lock:
+            self._scenes.pop(name, None)
+
+    def dumps(self) -> str:
+        """
+        :return: JSON object mapping each name to its encoded zone statuses,
+        i.e. '{"movie":"11000100001311121004011200..."}'
+        """
+        with self._lock:
+            scenes = list(self._scenes.values())
+        return json.dumps({scene.name: scene.to_bytes().decode() for scene in scenes}, separators=(",", ":"))
+
+    @classmethod
+    def loads(cls, text: str):
+        """
+        :param text: string returned by dumps
+        :return: SceneStore
+        :raise ValueError: if text isn't a dump of scenes
+        """
+        return cls(Scene.from_bytes(name, data.encode()) for name, data in json.loads(text).items())
+
+    def dump(self, path: str):
+        """
+        :param path: file to write
+        """
+        with open(path, "w") as file:
+            file.write(self.dumps())
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        :param path: file written by dump
+        :return: SceneStore
+        """
+        with open(path) as file:
+            return cls.loads(file.read())
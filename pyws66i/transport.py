@@ -0,0 +1,219 @@
+"""
+Transports carrying the WS66i protocol for the synchronous client.
+
+SocketTransport is the default. It talks to the WS66i over a plain TCP
+socket with a bounded receive buffer split into lines. TelnetTransport is
+the telnetlib based fallback, which is only available up to Python 3.12.
+"""
+import selectors
+import socket
+import time
+
+try:
+    from telnetlib import Telnet
+except ImportError:  # telnetlib was removed in Python 3.13
+    Telnet = None
+
+BUFFER_SIZE = 4096  # Maximum number of received bytes kept without a newline
+
+# Directions of the traffic recorded to a capture
+SENT = "sent"
+RECEIVED = "received"
+
+
+class Transport(object):
+    """
+    Connection to the WS66i. bytes_sent and bytes_received count the
+    traffic since the transport was created. The traffic is also recorded
+    to capture, a WireCapture, when it is set.
+    """
+
+    bytes_sent = 0
+    bytes_received = 0
+    capture = None
+
+    def open(self, host_name: str, host_port: int, timeout: float):
+        """
+        Connect to the WS66i
+        :param host_name: host name, i.e. '192.168.1.123'
+        :param host_port: port of the telnet server
+        :param timeout: number of seconds to wait for the connection
+        :raises OSError: the connection could not be established
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Close the connection. Does nothing if it is not open.
+        """
+        raise NotImplementedError
+
+    def is_open(self) -> bool:
+        """
+        :return: True while the connection is open
+        """
+        raise NotImplementedError
+
+    def write(self, data: bytes):
+        """
+        :param data: bytes to send
+        :raises OSError: the connection is closed or broken
+        """
+        raise NotImplementedError
+
+    def read_line(self, timeout: float) -> bytes:
+        """
+        :param timeout: number of seconds to wait for data
+        :return: received bytes up to and including a newline, or b"" if
+        nothing was received in time
+        :raises EOFError: the connection was closed
+        """
+        raise NotImplementedError
+
+    def expect(self, pattern, timeout: float):
+        """
+        Read until the pattern matches the received data. Data before the
+        match is discarded.
+        :param pattern: compiled regex
+        :param timeout: number of seconds to wait for a match
+        :return: Match object or None if nothing matched in time
+        :raises EOFError: the connection was closed
+        """
+        raise NotImplementedError
+
+
+class SocketTransport(Transport):
+    """
+    Transport over a plain TCP socket. Received data is split into lines and
+    no more than BUFFER_SIZE bytes are kept while waiting for a newline.
+    """
+
+    def __init__(self):
+        self._sock = None
+        # Unlike select.select, selectors work with file descriptors above 1023
+        self._selector = None
+        self._buffer = bytearray()
+
+    def open(self, host_name: str, host_port: int, timeout: float):
+        self.close()
+        sock = socket.create_connection((host_name, host_port), timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        selector = selectors.DefaultSelector()
+        selector.register(sock, selectors.EVENT_READ)
+        self._sock, self._selector = sock, selector
+
+    def close(self):
+        sock, self._sock = self._sock, None
+        selector, self._selector = self._selector, None
+        self._buffer.clear()
+        if selector is not None:
+            selector.close()
+        if sock is not None:
+            sock.close()
+
+    def is_open(self) -> bool:
+        return self._sock is not None
+
+    def write(self, data: bytes):
+        sock = self._sock
+        if sock is None:
+            raise BrokenPipeError("Connection is closed")
+        sock.sendall(data)
+        self.bytes_sent += len(data)
+        if self.capture is not None:
+            self.capture.record(SENT, data)
+
+    def _pop_line(self):
+        end = self._buffer.find(b"\n")
+        if end < 0:
+            return None
+        line = bytes(self._buffer[:end + 1])
+        del self._buffer[:end + 1]
+        return line
+
+    def _receive(self, timeout: float) -> bool:
+        """
+        :return: False if nothing was received in time
+        """
+        sock, selector = self._sock, self._selector
+        if sock is None:
+            raise EOFError
+        try:
+            readable = selector.select(max(timeout, 0))
+        except ValueError:
+            # Closed by another thread meanwhile
+            raise EOFError
+        if not readable:
+            return False
+        data = sock.recv(BUFFER_SIZE)
+        if not data:
+            raise EOFError
+        self.bytes_received += len(data)
+        if self.capture is not None:
+            self.capture.record(RECEIVED, data)
+        self._buffer += data
+        if len(self._buffer) > BUFFER_SIZE and b"\n" not in self._buffer:
+            # Not a line the WS66i would send, keep only the most recent bytes
+            del self._buffer[:-BUFFER_SIZE]
+        return True
+
+    def read_line(self, timeout: float) -> bytes:
+        deadline = time.monotonic() + timeout
+        line = self._pop_line()
+        while line is None:
+            if not self._receive(deadline - time.monotonic()):
+                return b""
+            line = self._pop_line()
+        return line
+
+    def expect(self, pattern, timeout: float):
+        deadline = time.monotonic() + timeout
+        while True:
+            line = self.read_line(deadline - time.monotonic())
+            if not line:
+                return None
+            match = pattern.search(line)
+            if match:
+                return match
+
+
+class TelnetTransport(Transport):
+    """
+    Transport over telnetlib, kept as a fallback for Python versions that
+    still ship it
+    """
+
+    def __init__(self):
+        if Telnet is None:
+            raise RuntimeError("telnetlib is not available in this version of Python")
+        self._telnet = Telnet()
+
+    def open(self, host_name: str, host_port: int, timeout: float):
+        self._telnet.open(host_name, host_port, timeout)
+
+    def close(self):
+        self._telnet.close()
+
+    def is_open(self) -> bool:
+        return bool(self._telnet.get_socket())
+
+    def write(self, data: bytes):
+        self._telnet.write(data)
+        self.bytes_sent += len(data)
+        if self.capture is not None:
+            self.capture.record(SENT, data)
+
+    def read_line(self, timeout: float) -> bytes:
+        line = self._telnet.read_until(b"\n", timeout)
+        self._received(line)
+        return line
+
+    def expect(self, pattern, timeout: float):
+        result = self._telnet.expect([pattern], timeout=timeout)
+        self._received(result[2] or b"")
+        return result[1]
+
+    def _received(self, data: bytes):
+        self.bytes_received += len(data)
+        if self.capture is not None:
+            self.capture.record(RECEIVED, data)
@@ -0,0 +1,79 @@
+import unittest
+from unittest import TestCase, mock
+
+from pyws66i import CircuitBreaker, STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN
+
+
+class TestCircuitBreaker(TestCase):
+    def test_states(self):
+        # setup
+        breaker = CircuitBreaker(failure_threshold=2)
+        states = []
+        breaker.add_listener(states.append)
+
+        # ----------- test opens after consecutive failures -----------
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.record_failure())
+        breaker.record_success()
+        self.assertFalse(breaker.record_failure())
+        self.assertTrue(breaker.record_failure())
+        self.assertEqual(STATE_OPEN, breaker.state)
+        self.assertFalse(breaker.allow())
+
+        # ----------- test failed probe goes back to open -----------
+        breaker.start_probe()
+        self.assertEqual(STATE_HALF_OPEN, breaker.state)
+        self.assertFalse(breaker.allow())
+        self.assertFalse(breaker.record_failure())
+        self.assertEqual(STATE_OPEN, breaker.state)
+
+        # ----------- test successful probe closes -----------
+        breaker.start_probe()
+        breaker.record_success()
+        self.assertTrue(breaker.allow())
+        self.assertEqual([STATE_OPEN, STATE_HALF_OPEN, STATE_OPEN, STATE_HALF_OPEN, STATE_CLOSED], states)
+
+
+    def test_backoff(self):
+        # setup
+        breaker = CircuitBreaker(initial_delay=1, max_delay=10)
+        breaker.record_failure()
+
+        # check
+        with mock.patch('pyws66i.breaker.random.uniform', side_effect=lambda low, high: high):
+            delays = []
+            for _ in range(6):
+                delays.append(breaker.next_delay())
+                breaker.start_probe()
+                breaker.record_failure()
+        self.assertEqual([1, 2, 4, 8, 10, 10], delays)
+
+        # ----------- test jitter keeps at least half of the delay -----------
+        with mock.patch('pyws66i.breaker.random.uniform', side_effect=lambda low, high: low):
+            self.assertEqual(5, breaker.next_delay())
+
+        # ----------- test success resets the backoff -----------
+        breaker.reset()
+        with mock.patch('pyws66i.breaker.random.uniform', side_effect=lambda low, high: high):
+            self.assertEqual(1, breaker.next_delay())
+
+
+    def test_listener_error(self):
+        # setup
+        breaker = CircuitBreaker()
+        breaker.add_listener(mock.MagicMock(side_effect=ValueError()))
+        callback = mock.MagicMock()
+        breaker.add_listener(callback)
+
+        # call
+        breaker.record_failure()
+
+        # check
+        callback.assert_called_once_with(STATE_OPEN)
+        breaker.remove_listener(callback)
+        breaker.reset()
+        callback.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
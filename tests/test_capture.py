@@ -0,0 +1,101 @@
+import unittest
+from unittest import TestCase
+import os
+import tempfile
+
+from pyws66i import get_ws66i, ReplayTransport, WireCapture, WS66iEmulator, replay
+from pyws66i.capture import undecodable_lines
+from pyws66i.transport import RECEIVED, SENT
+
+
+class TestWireCapture(TestCase):
+    def test_ring_buffer(self):
+        capture = WireCapture(max_records=2)
+        capture.record(SENT, b"?11\r")
+        capture.record(RECEIVED, b"")
+        capture.record(RECEIVED, b"#>11")
+        capture.record(RECEIVED, b"00010000131112100401\r\r\n")
+        self.assertEqual(
+            [(RECEIVED, b"#>11"), (RECEIVED, b"00010000131112100401\r\r\n")],
+            [(direction, data) for _, direction, data in capture.records()],
+        )
+
+        capture.clear()
+        self.assertEqual([], capture.records())
+
+
+    def test_dump_and_load(self):
+        # setup
+        capture = WireCapture()
+        capture.record(SENT, b"?11\r")
+        capture.record(RECEIVED, b"\r\n#>1100010000131112100401\r\r\n#\xff")
+        path = os.path.join(tempfile.mkdtemp(), "capture.jsonl")
+        self.addCleanup(os.remove, path)
+
+        # call
+        capture.dump(path)
+
+        # check
+        self.assertEqual(capture.records(), WireCapture.load(path))
+
+
+    def test_capture_client(self):
+        # setup
+        capture = WireCapture()
+        with WS66iEmulator() as emulator:
+            ws66i = get_ws66i(emulator.host_name, emulator.host_port, capture=capture)
+            ws66i.open()
+
+            # call
+            ws66i.set_volume(11, 12)
+            ws66i.zone_status(11)
+            ws66i.close()
+
+        # check
+        sent = [data for _, direction, data in capture.records() if direction == SENT]
+        received = b"".join(data for _, direction, data in capture.records() if direction == RECEIVED)
+        self.assertEqual([b"<11VO12\r", b"?11\r"], sent)
+        self.assertIn(b"#>1100000000120707100101\r\r\n", received)
+
+
+class TestReplay(TestCase):
+    def test_replay(self):
+        # setup
+        records = [
+            (0.0, SENT, b"<12MU01\r"),
+            (0.1, RECEIVED, b"\r\n#"),
+            (0.2, SENT, b"?11\r"),
+            (0.3, RECEIVED, b"\r\n#>1100010000131112100401\r\r\n#"),
+            (0.4, SENT, b"?12\r?13\r"),
+            (0.5, RECEIVED, b"\r\n#>120001"),
+            (0.6, RECEIVED, b"0000131112100401\r\r\n#\r\n#>1300010000131112100401\r\r\n#"),
+            (0.7, SENT, b"?14\r"),
+        ]
+
+        # call
+        results = replay(records)
+
+        # check
+        self.assertEqual([b"<12MU01\r", b"?11\r", b"?12\r?13\r", b"?14\r"], [request for request, _ in results])
+        self.assertIsNone(results[0][1])
+        self.assertEqual(13, results[1][1].volume)
+        self.assertEqual([12, 13], [status.zone for status in results[2][1]])
+        # The reply to ?14 was lost in the field, and is lost in the replay
+        self.assertIsNone(results[3][1])
+
+
+    def test_mismatch(self):
+        transport = ReplayTransport([(0.0, SENT, b"?11\r"), (0.1, RECEIVED, b"#>11\r\n")])
+        transport.open("replay", 8080, 1)
+        transport.write(b"?12\r")
+        self.assertEqual(1, transport.mismatches)
+        self.assertEqual(b"#>11\r\n", transport.read_line(0))
+
+
+    def test_undecodable_lines(self):
+        records = [(0.0, RECEIVED, b"#>1100010000131112100401\r\r\n#>11000#>1200010000131112100401\r\r\n")]
+        self.assertEqual([b"#>11000#>1200010000131112100401\r\r"], undecodable_lines(records))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+from unittest import TestCase
+
+from pyws66i import codec, ZoneStatus
+
+
+class TestEncode(TestCase):
+    def test_table_matches_format(self):
+        # ----------- test every precomputed command -----------
+        for zone in codec.ZONES:
+            for volume in range(0, 39):
+                self.assertEqual(f'<{zone}VO{volume:02}\r'.encode(), codec.format_set_volume(zone, volume))
+            for value in range(0, 15):
+                self.assertEqual(f'<{zone}TR{value:02}\r'.encode(), codec.format_set_treble(zone, value))
+                self.assertEqual(f'<{zone}BS{value:02}\r'.encode(), codec.format_set_bass(zone, value))
+            for balance in range(0, 21):
+                self.assertEqual(f'<{zone}BL{balance:02}\r'.encode(), codec.format_set_balance(zone, balance))
+            for source in range(1, 7):
+                self.assertEqual(f'<{zone}CH{source:02}\r'.encode(), codec.format_set_source(zone, source))
+            self.assertEqual(f'<{zone}PR01\r'.encode(), codec.format_set_power(zone, True))
+            self.assertEqual(f'<{zone}MU00\r'.encode(), codec.format_set_mute(zone, False))
+            self.assertEqual(f'?{zone}\r'.encode(), codec.format_zone_status_request(zone))
+
+
+    def test_clamp(self):
+        self.assertEqual(b'<11VO38\r', codec.format_set_volume(11, 100))
+        self.assertEqual(b'<11VO00\r', codec.format_set_volume(11, -1))
+        self.assertEqual(b'<11VO12\r', codec.format_set_volume(11, 12.7))
+        self.assertEqual(b'<11BL20\r', codec.format_set_balance(11, 21))
+        self.assertEqual(b'<11CH01\r', codec.format_set_source(11, 0))
+        self.assertEqual(b'<11PR01\r', codec.format_set_power(11, "True"))
+        self.assertEqual(b'<11PR00\r', codec.format_set_power(11, ""))
+
+
+    def test_unknown_zone(self):
+        self.assertEqual(b'<41VO05\r', codec.format_set_volume(41, 5))
+        self.assertEqual(b'?41\r', codec.format_zone_status_request(41))
+
+
+    def test_controller(self):
+        self.assertEqual(b'?20\r', codec.format_controller_status_request(2))
+        self.assertEqual([31, 32, 33, 34, 35, 36], list(codec.controller_zones(3)))
+
+
+    def test_decode_set_commands(self):
+        self.assertEqual([(11, "volume", 20), (12, "mute", 1)],
+                         list(codec.decode_set_commands(b'<11VO20\r<12MU01\r?11\r<1XVO01\r')))
+
+
+class TestDecode(TestCase):
+    def test_parse_zone_status_line(self):
+        # ----------- test good line -----------
+        expected = (11, 0, 1, 0, 0, 13, 11, 12, 10, 4, 1)
+        self.assertEqual(expected, codec.parse_zone_status_line(b"#>1100010000131112100401\r\r\n"))
+        self.assertEqual(expected, codec.parse_zone_status_line(b"##>1100010000131112100401"))
+        self.assertEqual(expected, codec.parse_zone_status_line(bytearray(b"#>1100010000131112100401")))
+        self.assertEqual(expected, codec.parse_zone_status_line(memoryview(b"#>1100010000131112100401\r\n")))
+
+        # ----------- test lines that aren't zone statuses -----------
+        self.assertIsNone(codec.parse_zone_status_line(b"#\r\n"))
+        self.assertIsNone(codec.parse_zone_status_line(b"?11\r"))
+        self.assertIsNone(codec.parse_zone_status_line(b"#>11000100001311121004"))
+        self.assertIsNone(codec.parse_zone_status_line(b"#>11000100001311121004x1"))
+        self.assertIsNone(codec.parse_zone_status_line(b"1100010000131112100401"))
+
+
+    def test_decode_zone_status(self):
+        data = memoryview(b"xx3600000000000000000006")
+        self.assertEqual((36, 0, 0, 0, 0, 0, 0, 0, 0, 0, 6), codec.decode_zone_status(data, 2))
+
+
+    def test_zone_pattern(self):
+        match = codec.zone_pattern(12).search(b"#>1100010000131112100401\r\r\n#>1200010000201112100401")
+        self.assertEqual(20, ZoneStatus.from_string(match).volume)
+        self.assertIs(codec.zone_pattern(12), codec.zone_pattern(12))
+
+
+    def test_zone_status_from_line(self):
+        status = ZoneStatus.from_line(b"#>2101000001201112100401\r\r\n")
+        self.assertEqual(21, status.zone)
+        self.assertTrue(status.pa)
+        self.assertFalse(status.power)
+        self.assertTrue(status.do_not_disturb)
+        self.assertIsNone(ZoneStatus.from_line(b"#\r\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+import gc
+import unittest
+from unittest import TestCase
+import queue
+import threading
+import time
+
+from pyws66i import get_ws66i, get_async_ws66i, CircuitBreaker, STATE_CLOSED, WS66iEmulator
+
+
+class TestWS66iEmulator(TestCase):
+    def setUp(self):
+        self.emulator = WS66iEmulator(controllers=(1, 2))
+        self.emulator.start()
+        self.addCleanup(self.emulator.stop)
+        self.ws66i = get_ws66i(self.emulator.host_name, self.emulator.host_port)
+        self.ws66i.open()
+        self.addCleanup(self.ws66i.close)
+
+
+    def test_zone_status(self):
+        status = self.ws66i.zone_status(11)
+        self.assertEqual(11, status.zone)
+        self.assertFalse(status.power)
+        self.assertEqual(20, status.volume)
+
+        # ----------- test absent expander doesn't reply -----------
+        self.assertIsNone(self.ws66i.zone_status(31, timeout=0.05))
+
+
+    def test_setters(self):
+        # call
+        self.ws66i.set_power(12, True)
+        self.ws66i.set_volume(12, 50)
+        self.ws66i.set_source(12, 4)
+
+        # check
+        status = self.ws66i.zone_status(12)
+        self.assertTrue(status.power)
+        self.assertEqual(38, status.volume)
+        self.assertEqual(4, status.source)
+        self.assertEqual(38, self.emulator.zone(12)["volume"])
+
+
+    def test_controller_status(self):
+        self.assertEqual([21, 22, 23, 24, 25, 26], [status.zone for status in self.ws66i.controller_status(2)])
+        self.assertEqual([1, 2], self.ws66i.probe_topology(timeout=0.05))
+
+
+    def test_keypad_update(self):
+        # setup
+        updates = queue.Queue()
+        self.ws66i.subscribe(updates.put)
+
+        # call
+        self.emulator.keypad_update(13, volume=5, mute=1)
+
+        # check
+        status = updates.get(timeout=1)
+        self.assertEqual(13, status.zone)
+        self.assertEqual(5, status.volume)
+        self.assertTrue(status.mute)
+
+
+    def test_callback_calls_client(self):
+        # setup
+        self.emulator.latency = 0.3
+        done = threading.Event()
+
+        def on_update(status):
+            if status.zone == 12:
+                self.ws66i.set_volume(12, 5)
+                done.set()
+
+        self.ws66i.subscribe(on_update)
+        statuses = queue.Queue()
+        thread = threading.Thread(target=lambda: statuses.put(self.ws66i.zone_status(11, timeout=1.0)))
+
+        # call
+        thread.start()
+        time.sleep(0.05)
+        self.emulator.keypad_update(12, volume=12)
+
+        # check
+        self.assertEqual(11, statuses.get(timeout=2).zone)
+        self.assertTrue(done.wait(2))
+        thread.join(timeout=1)
+        self.assertEqual(5, self.ws66i.zone_status(12).volume)
+
+
+    def test_dropped_client_collected(self):
+        # setup
+        ws66i = get_ws66i(self.emulator.host_name, self.emulator.host_port)
+        ws66i.open()
+        self.assertIsNotNone(ws66i.zone_status(11))
+        worker = ws66i._worker
+
+        # call
+        del ws66i
+        gc.collect()
+
+        # check
+        worker.join(timeout=1)
+        self.assertFalse(worker.is_alive())
+        deadline = time.monotonic() + 1
+        while len(self.emulator._connections) > 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(1, len(self.emulator._connections))
+
+
+    def test_breaker_counts_consecutive_failures_while_listening(self):
+        # setup
+        breaker = CircuitBreaker(failure_threshold=3)
+        ws66i = get_ws66i(self.emulator.host_name, self.emulator.host_port, breaker=breaker)
+        ws66i.open()
+        self.addCleanup(ws66i.close)
+        ws66i.subscribe(lambda status: None)
+
+        # call
+        for _ in range(3):
+            self.emulator.drop_rate = 1.0
+            self.assertIsNone(ws66i.zone_status(11, timeout=0.05))
+            self.emulator.drop_rate = 0.0
+            self.assertIsNotNone(ws66i.zone_status(11))
+
+        # check
+        self.assertEqual(STATE_CLOSED, breaker.state)
+
+
+    def test_latency_and_drops(self):
+        # ----------- test latency delays the reply -----------
+        self.emulator.latency = 0.05
+        start = time.monotonic()
+        self.assertIsNotNone(self.ws66i.zone_status(11))
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+
+        # ----------- test dropped reply -----------
+        self.emulator.latency = 0.0
+        self.emulator.drop_rate = 1.0
+        self.assertIsNone(self.ws66i.zone_status(11, timeout=0.05))
+
+
+    def test_power_off(self):
+        # call
+        self.emulator.power_off()
+
+        # check
+        self.assertIsNone(self.ws66i.zone_status(11))
+        self.assertIsNone(self.ws66i.zone_status(11))
+
+        # ----------- test client reconnects after power on -----------
+        self.emulator.power_on()
+        self.assertEqual(11, self.ws66i.zone_status(11).zone)
+
+
+class TestAsyncWS66iEmulator(unittest.IsolatedAsyncioTestCase):
+    async def test_zone_status(self):
+        with WS66iEmulator() as emulator:
+            ws66i = get_async_ws66i(emulator.host_name, emulator.host_port)
+            await ws66i.open()
+            await ws66i.set_volume(11, 30)
+            status = await ws66i.zone_status(11)
+            await ws66i.close()
+
+        self.assertEqual(30, status.volume)
+
+
+if __name__ == "__main__":
+    unittest.main()
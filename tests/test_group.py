@@ -0,0 +1,77 @@
+import unittest
+from unittest import TestCase
+
+from pyws66i import get_ws66i, get_async_ws66i, AsyncZoneGroup, WireCapture, WS66iEmulator, ZoneGroup
+from pyws66i.transport import SENT
+
+
+class TestZoneGroup(TestCase):
+    def setUp(self):
+        self.emulator = WS66iEmulator(controllers=(1, 2))
+        self.emulator.start()
+        self.addCleanup(self.emulator.stop)
+        self.capture = WireCapture()
+        self.ws66i = get_ws66i(self.emulator.host_name, self.emulator.host_port, capture=self.capture)
+        self.ws66i.open()
+        self.addCleanup(self.ws66i.close)
+        self.group = ZoneGroup(self.ws66i, [11, 12, 21], name="downstairs", offsets={21: -5})
+
+
+    def sent(self):
+        return [data for _, direction, data in self.capture.records() if direction == SENT]
+
+
+    def test_setters(self):
+        # call
+        self.group.set_power(True)
+        self.group.set_mute(True)
+        self.group.set_source(3)
+        self.group.set_volume(2)
+
+        # check
+        self.assertEqual([
+            b"<11PR01\r<12PR01\r<21PR01\r",
+            b"<11MU01\r<12MU01\r<21MU01\r",
+            b"<11CH03\r<12CH03\r<21CH03\r",
+            b"<11VO02\r<12VO02\r<21VO00\r",
+        ], self.sent())
+
+
+    def test_step_volume(self):
+        # setup
+        self.group.set_volume(30)
+        self.capture.clear()
+
+        # call
+        steps = self.group.step_volume(20)
+
+        # check
+        self.assertEqual(8, steps)
+        self.assertEqual([b"?11\r?12\r?21\r", b"<11VO38\r<12VO38\r<21VO33\r"], self.sent())
+
+        # ----------- test lowering stops at the quietest zone -----------
+        self.assertEqual(-33, self.group.step_volume(-40))
+        self.assertEqual([5, 5, 0], [status.volume for status in self.ws66i.zone_statuses([11, 12, 21])])
+        self.capture.clear()
+        self.assertEqual(0, self.group.step_volume(-1))
+        self.assertEqual([b"?11\r?12\r?21\r"], self.sent())
+
+
+class TestAsyncZoneGroup(unittest.IsolatedAsyncioTestCase):
+    async def test_group(self):
+        with WS66iEmulator(controllers=(1, 2)) as emulator:
+            ws66i = get_async_ws66i(emulator.host_name, emulator.host_port)
+            await ws66i.open()
+            group = AsyncZoneGroup(ws66i, [11, 21], offsets={11: 2})
+            await group.set_power(True)
+            await group.set_volume(10)
+            steps = await group.step_volume(-4)
+            statuses = await ws66i.zone_statuses([11, 21])
+            await ws66i.close()
+
+        self.assertEqual(-4, steps)
+        self.assertEqual([(True, 8), (True, 6)], [(status.power, status.volume) for status in statuses])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+from unittest import TestCase, mock
+import threading
+import time
+
+from pyws66i import WS66iManager, ZoneStatus
+
+
+def _status(zone: int) -> ZoneStatus:
+    return ZoneStatus(zone, 0, 1, 0, 0, 13, 11, 12, 10, 4, 1)
+
+
+class TestWS66iManager(TestCase):
+    def setUp(self):
+        self.clients = {}
+
+        def factory(host):
+            client = mock.MagicMock()
+            client.zone_statuses.side_effect = lambda zones: [_status(zone) for zone in zones]
+            self.clients[host] = client
+            return client
+
+        self.manager = WS66iManager(["amp1", "amp2"], zones=[11, 12], factory=factory)
+        self.addCleanup(self.manager.close)
+
+
+    def test_refresh(self):
+        # call
+        self.assertEqual(["amp1", "amp2"], self.manager.open())
+        statuses = self.manager.refresh()
+
+        # check
+        self.assertEqual({("amp1", 11), ("amp1", 12), ("amp2", 11), ("amp2", 12)}, set(statuses))
+        self.assertEqual(_status(12), statuses[("amp2", 12)])
+        self.assertEqual(statuses, self.manager.statuses())
+        self.assertEqual({"amp1", "amp2"}, set(self.manager.latencies()))
+        self.clients["amp1"].zone_statuses.assert_called_once_with([11, 12])
+        self.assertIs(self.clients["amp2"], self.manager.client("amp2"))
+
+
+    def test_offline_host(self):
+        # setup
+        self.clients["amp2"].open.side_effect = ConnectionError()
+
+        # ----------- test host that can't be opened is skipped -----------
+        self.assertEqual(["amp1"], self.manager.open())
+        statuses = self.manager.refresh()
+        self.assertEqual({("amp1", 11), ("amp1", 12)}, set(statuses))
+        self.clients["amp2"].zone_statuses.assert_not_called()
+
+        # ----------- test host is opened again by the next refresh -----------
+        self.clients["amp2"].open.side_effect = None
+        statuses = self.manager.refresh()
+        self.assertEqual(4, len(statuses))
+
+        # ----------- test host whose client raises is left out -----------
+        self.clients["amp2"].zone_statuses.side_effect = ValueError()
+        statuses = self.manager.refresh()
+        self.assertEqual({("amp1", 11), ("amp1", 12)}, set(statuses))
+        self.assertIsNone(self.manager.latencies()["amp2"])
+
+        # ----------- test host that stops answering drops out of the view -----------
+        self.clients["amp2"].zone_statuses.side_effect = lambda zones: [_status(zone) for zone in zones]
+        self.manager.refresh()
+        self.clients["amp2"].zone_statuses.side_effect = lambda zones: None
+        self.manager.refresh()
+        self.assertEqual({("amp1", 11), ("amp1", 12)}, set(self.manager.statuses()))
+
+
+    def test_slow_host_doesnt_stall(self):
+        # setup
+        release = threading.Event()
+        self.addCleanup(release.set)
+        self.clients["amp2"].zone_statuses.side_effect = lambda zones: release.wait() and [_status(11)]
+        self.manager.open()
+
+        # call
+        start = time.monotonic()
+        statuses = self.manager.refresh(timeout=0.1)
+
+        # check
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual({("amp1", 11), ("amp1", 12)}, set(statuses))
+        self.assertIsNone(self.manager.latencies()["amp2"])
+        self.assertIsNotNone(self.manager.latencies()["amp1"])
+
+        # ----------- test the slow host isn't asked again while busy -----------
+        for _ in range(3):
+            statuses = self.manager.refresh(timeout=0.1)
+            self.assertEqual({("amp1", 11), ("amp1", 12)}, set(statuses))
+        self.clients["amp2"].zone_statuses.assert_called_once()
+
+        # ----------- test the next refresh gets its late answer -----------
+        release.set()
+        statuses = self.manager.refresh(timeout=1)
+        self.assertEqual({("amp1", 11), ("amp1", 12), ("amp2", 11)}, set(statuses))
+        self.clients["amp2"].zone_statuses.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
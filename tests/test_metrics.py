@@ -0,0 +1,123 @@
+import unittest
+from unittest import TestCase
+
+from pyws66i import get_ws66i, get_async_ws66i, Metrics, WS66iEmulator
+from pyws66i.metrics import command_name
+
+
+class TestMetrics(TestCase):
+    def test_command_name(self):
+        self.assertEqual("zone_status", command_name(b"?11\r"))
+        self.assertEqual("controller_status", command_name(b"?20\r"))
+        self.assertEqual("zone_statuses", command_name(b"?11\r?12\r"))
+        self.assertEqual("set_volume", command_name(b"<11VO20\r"))
+        self.assertEqual("set_source", command_name(b"<11CH02\r"))
+        self.assertEqual("set_multiple", command_name(b"<11VO20\r<11MU01\r"))
+
+
+    def test_snapshot(self):
+        # setup
+        events = []
+        metrics = Metrics(callback=lambda name, value: events.append((name, value)))
+
+        # call
+        metrics.observe_latency("zone_status", 0.0015)
+        metrics.observe_latency("zone_status", 10.0)
+        metrics.observe_lock_wait(0.0)
+        metrics.increment("timeouts")
+        metrics.increment("bytes_sent", 0)
+
+        # check
+        snapshot = metrics.snapshot()
+        histogram = snapshot["latency"]["zone_status"]
+        self.assertEqual(2, histogram["count"])
+        self.assertEqual(0.0015, histogram["min"])
+        self.assertEqual(10.0, histogram["max"])
+        self.assertEqual(1, histogram["buckets"]["0.002"])
+        self.assertEqual(1, histogram["buckets"]["inf"])
+        self.assertEqual(1, snapshot["lock_wait"]["count"])
+        self.assertEqual(1, snapshot["counters"]["timeouts"])
+        self.assertEqual(0, snapshot["counters"]["bytes_sent"])
+        self.assertEqual(
+            [("latency.zone_status", 0.0015), ("latency.zone_status", 10.0), ("lock_wait", 0.0), ("timeouts", 1)],
+            events,
+        )
+
+        # ----------- test reset -----------
+        metrics.reset()
+        self.assertEqual({}, metrics.snapshot()["latency"])
+
+
+    def test_callback_error(self):
+        def callback(name, value):
+            raise ValueError()
+
+        metrics = Metrics(callback=callback)
+        metrics.increment("errors")
+        self.assertEqual(1, metrics.snapshot()["counters"]["errors"])
+
+
+class TestClientMetrics(TestCase):
+    def setUp(self):
+        self.emulator = WS66iEmulator()
+        self.emulator.start()
+        self.addCleanup(self.emulator.stop)
+        self.metrics = Metrics()
+        self.ws66i = get_ws66i(self.emulator.host_name, self.emulator.host_port, metrics=self.metrics)
+        self.ws66i.open()
+        self.addCleanup(self.ws66i.close)
+
+
+    def test_requests(self):
+        # call
+        self.ws66i.zone_status(11)
+        self.ws66i.set_volume(11, 10)
+
+        # check
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(1, snapshot["latency"]["zone_status"]["count"])
+        self.assertEqual(1, snapshot["latency"]["set_volume"]["count"])
+        # open, zone_status and set_volume each waited for the I/O worker
+        self.assertEqual(3, snapshot["lock_wait"]["count"])
+        self.assertEqual(len(b"?11\r<11VO10\r"), snapshot["counters"]["bytes_sent"])
+        self.assertGreaterEqual(snapshot["counters"]["bytes_received"], len(b"#>1100000000200707100101\r\r\n"))
+
+
+    def test_errors(self):
+        # ----------- test lost reply -----------
+        self.emulator.drop_rate = 1.0
+        self.assertIsNone(self.ws66i.zone_status(11, timeout=0.05))
+        self.assertEqual(1, self.metrics.snapshot()["counters"]["timeouts"])
+
+        # ----------- test reconnect -----------
+        self.emulator.drop_rate = 0.0
+        self.assertIsNotNone(self.ws66i.zone_status(11))
+        counters = self.metrics.snapshot()["counters"]
+        self.assertEqual(1, counters["reconnect_attempts"])
+        self.assertEqual(1, counters["reconnects"])
+
+        # ----------- test amp turned off -----------
+        self.emulator.power_off()
+        self.assertIsNone(self.ws66i.zone_status(11))
+        self.assertEqual(1, self.metrics.snapshot()["counters"]["eof"])
+
+
+class TestAsyncClientMetrics(unittest.IsolatedAsyncioTestCase):
+    async def test_requests(self):
+        metrics = Metrics()
+        with WS66iEmulator() as emulator:
+            ws66i = get_async_ws66i(emulator.host_name, emulator.host_port, metrics=metrics)
+            await ws66i.open()
+            await ws66i.zone_status(11)
+            await ws66i.set_mute(11, True)
+            await ws66i.close()
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(1, snapshot["latency"]["zone_status"]["count"])
+        self.assertEqual(1, snapshot["latency"]["set_mute"]["count"])
+        self.assertEqual(len(b"?11\r<11MU01\r"), snapshot["counters"]["bytes_sent"])
+        self.assertGreater(snapshot["counters"]["bytes_received"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import threading
+import unittest
+from unittest import TestCase, mock
+
+from pyws66i import AdaptivePoller, ZoneStatus, get_ws66i, WS66iEmulator
+
+
+def status(zone, power=True, volume=20):
+    return ZoneStatus(zone, 0, power, 0, 0, volume, 7, 7, 10, 1, 1)
+
+
+class TestAdaptivePoller(TestCase):
+    def setUp(self):
+        self.ws66i = mock.MagicMock()
+        self.updates = []
+        self.poller = AdaptivePoller(
+            self.ws66i, zones=[11, 12], callback=self.updates.append,
+            active_interval=1.0, idle_interval=4.0, off_interval=16.0,
+        )
+        self.patcher = mock.patch('pyws66i.poller.time.monotonic', return_value=1000.0)
+        self.monotonic = self.patcher.start()
+        self.addCleanup(self.patcher.stop)
+        self.poller.wake()
+
+
+    def advance(self, seconds):
+        self.monotonic.return_value += seconds
+
+
+    def test_backoff(self):
+        # setup
+        current = {11: status(11), 12: status(12, power=False)}
+        self.ws66i.zone_statuses.side_effect = lambda zones: [current[zone] for zone in zones]
+
+        # ----------- test the first poll asks for every zone -----------
+        self.assertEqual([11, 12], self.poller.poll())
+        self.ws66i.zone_statuses.assert_called_once_with([11, 12])
+        self.assertEqual([status(11), status(12, power=False)], self.updates)
+        self.assertEqual(1.0, self.poller.interval(11))
+
+        # ----------- test unchanged zones back off to their limit -----------
+        for expected_on, expected_off in ((2.0, 2.0), (4.0, 4.0), (4.0, 8.0), (4.0, 8.0), (4.0, 16.0)):
+            self.advance(self.poller.interval(11))
+            self.assertEqual([], self.poller.poll())
+            self.assertEqual(expected_on, self.poller.interval(11))
+            self.assertEqual(expected_off, self.poller.interval(12))
+
+        # ----------- test nothing is asked for before a zone is due -----------
+        self.ws66i.zone_statuses.reset_mock()
+        self.assertEqual([], self.poller.poll())
+        self.ws66i.zone_statuses.assert_not_called()
+
+        # ----------- test a change polls the zone often again -----------
+        self.advance(4.0)
+        current[11] = status(11, volume=30)
+        self.assertEqual([11], self.poller.poll())
+        self.ws66i.zone_statuses.assert_called_once_with([11])
+        self.assertEqual(1.0, self.poller.interval(11))
+        self.assertEqual(30, self.poller.statuses()[11].volume)
+
+
+    def test_no_reply(self):
+        # setup
+        self.ws66i.zone_statuses.return_value = None
+
+        # call
+        self.assertIsNone(self.poller.poll())
+        self.advance(2.0)
+        self.assertIsNone(self.poller.poll())
+
+        # check
+        self.assertEqual(4.0, self.poller.interval(11))
+        self.assertEqual([], self.updates)
+
+        # ----------- test wake polls right away -----------
+        self.poller.wake([11])
+        self.ws66i.zone_statuses.return_value = [status(11)]
+        self.assertEqual([11], self.poller.poll())
+        self.ws66i.zone_statuses.assert_called_with([11])
+
+
+    def test_absent_zone(self):
+        # setup
+        self.ws66i.zone_statuses.return_value = [status(11)]
+
+        # call
+        self.poller.poll()
+
+        # check
+        self.assertEqual(2.0, self.poller.interval(12))
+        self.assertNotIn(12, self.poller.statuses())
+
+
+class TestAdaptivePollerThread(TestCase):
+    def test_thread(self):
+        updated = threading.Event()
+        with WS66iEmulator() as emulator:
+            ws66i = get_ws66i(emulator.host_name, emulator.host_port)
+            ws66i.open()
+            self.addCleanup(ws66i.close)
+            with AdaptivePoller(ws66i, zones=[11], callback=lambda status: updated.set(), active_interval=0.01):
+                self.assertTrue(updated.wait(1))
+
+
+if __name__ == "__main__":
+    unittest.main()
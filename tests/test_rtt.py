@@ -0,0 +1,62 @@
+import unittest
+from unittest import TestCase
+
+from pyws66i import RttEstimator
+
+
+class TestRttEstimator(TestCase):
+    def test_initial_timeout(self):
+        estimator = RttEstimator(initial_timeout=0.8)
+        self.assertEqual(0.8, estimator.timeout())
+        self.assertIsNone(estimator.srtt)
+        self.assertIsNone(estimator.rttvar)
+
+
+    def test_samples(self):
+        estimator = RttEstimator(min_timeout=0.0)
+
+        # ----------- test first sample -----------
+        estimator.add_sample(0.1)
+        self.assertAlmostEqual(0.1, estimator.srtt)
+        self.assertAlmostEqual(0.05, estimator.rttvar)
+        self.assertAlmostEqual(0.3, estimator.timeout())
+
+        # ----------- test following sample is smoothed -----------
+        estimator.add_sample(0.2)
+        self.assertAlmostEqual(0.0625, estimator.rttvar)
+        self.assertAlmostEqual(0.1125, estimator.srtt)
+        self.assertAlmostEqual(0.3625, estimator.timeout())
+
+
+    def test_bounds(self):
+        estimator = RttEstimator(min_timeout=0.1, max_timeout=1.0)
+
+        # ----------- test fast replies are clamped to min_timeout -----------
+        estimator.add_sample(0.001)
+        self.assertEqual(0.1, estimator.timeout())
+
+        # ----------- test slow replies are clamped to max_timeout -----------
+        estimator = RttEstimator(min_timeout=0.1, max_timeout=1.0)
+        estimator.add_sample(5.0)
+        self.assertEqual(1.0, estimator.timeout())
+
+
+    def test_backoff(self):
+        estimator = RttEstimator(min_timeout=0.1, max_timeout=1.0)
+        estimator.add_sample(0.001)
+
+        # ----------- test timeout doubles on every lost reply -----------
+        estimator.on_timeout()
+        self.assertAlmostEqual(0.2, estimator.timeout())
+        estimator.on_timeout()
+        estimator.on_timeout()
+        estimator.on_timeout()
+        self.assertEqual(1.0, estimator.timeout())
+
+        # ----------- test next sample resets the backoff -----------
+        estimator.add_sample(0.001)
+        self.assertAlmostEqual(0.1, estimator.timeout())
+
+
+if __name__ == "__main__":
+    unittest.main()
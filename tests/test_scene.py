@@ -0,0 +1,116 @@
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+
+from pyws66i import get_ws66i, get_async_ws66i, Scene, SceneStore, WireCapture, WS66iEmulator, ZoneStatus
+from pyws66i.transport import SENT
+
+
+class TestScene(TestCase):
+    def test_bytes(self):
+        # setup
+        scene = Scene("movie", [
+            ZoneStatus(11, 0, 1, 0, 0, 10, 7, 7, 10, 2, 1),
+            ZoneStatus(21, 0, 0, 1, 0, 38, 14, 0, 20, 6, 0),
+        ])
+
+        # call
+        data = scene.to_bytes()
+
+        # check
+        self.assertEqual(b"1100010000100707100201" b"2100000100381400200600", data)
+        self.assertEqual(scene, Scene.from_bytes("movie", data))
+        self.assertEqual([11, 21], scene.zones)
+
+        # ----------- test invalid data -----------
+        with self.assertRaises(ValueError):
+            Scene.from_bytes("movie", data[:-1])
+        with self.assertRaises(ValueError):
+            Scene.from_bytes("movie", b"x" * 22)
+
+
+    def test_store(self):
+        # setup
+        store = SceneStore([Scene("off", [ZoneStatus(11, 0, 0, 0, 0, 0, 7, 7, 10, 1, 1)])])
+        store.add(Scene("party", [ZoneStatus(12, 0, 1, 0, 0, 30, 7, 7, 10, 3, 1)]))
+        store.add(Scene("empty", []))
+        store.remove("empty")
+
+        # call
+        text = store.dumps()
+        loaded = SceneStore.loads(text)
+
+        # check
+        self.assertEqual('{"off":"1100000000000707100101","party":"1200010000300707100301"}', text)
+        self.assertEqual(["off", "party"], loaded.names())
+        self.assertEqual(store.get("party"), loaded.get("party"))
+        self.assertIn("off", loaded)
+        self.assertIsNone(loaded.get("empty"))
+
+        # ----------- test file round trip -----------
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "scenes.json")
+            store.dump(path)
+            self.assertEqual(store.get("off"), SceneStore.load(path).get("off"))
+
+
+class TestWs66iScene(TestCase):
+    def setUp(self):
+        self.emulator = WS66iEmulator(controllers=(1, 2))
+        self.emulator.start()
+        self.addCleanup(self.emulator.stop)
+        self.capture = WireCapture()
+        self.ws66i = get_ws66i(
+            self.emulator.host_name, self.emulator.host_port, topology=[1, 2], capture=self.capture
+        )
+        self.ws66i.open()
+        self.addCleanup(self.ws66i.close)
+
+
+    def test_apply_scene(self):
+        # setup
+        self.ws66i.set_power(11, True)
+        self.ws66i.set_volume(11, 30)
+        self.ws66i.set_source(21, 4)
+        scene = self.ws66i.capture_scene("evening", [11, 12, 21, 31])
+        self.ws66i.set_volume(11, 5)
+        self.ws66i.set_mute(12, True)
+        self.ws66i.set_source(21, 1)
+        self.capture.clear()
+
+        # call
+        self.ws66i.apply_scene(scene)
+
+        # check
+        self.assertEqual([11, 12, 21], scene.zones)
+        self.assertEqual(
+            [b"?11\r?12\r?21\r", b"<11VO30\r<12MU00\r<21CH04\r"],
+            [data for _, direction, data in self.capture.records() if direction == SENT],
+        )
+        self.assertEqual(scene.statuses, tuple(self.ws66i.zone_statuses(scene.zones)))
+
+        # ----------- test nothing is sent when the zones already match -----------
+        self.capture.clear()
+        self.ws66i.apply_scene(scene)
+        self.assertEqual(
+            [b"?11\r?12\r?21\r"], [data for _, direction, data in self.capture.records() if direction == SENT]
+        )
+
+
+class TestAsyncWs66iScene(unittest.IsolatedAsyncioTestCase):
+    async def test_apply_scene(self):
+        with WS66iEmulator() as emulator:
+            ws66i = get_async_ws66i(emulator.host_name, emulator.host_port)
+            await ws66i.open()
+            scene = await ws66i.capture_scene("quiet", [11, 12])
+            await ws66i.set_volume(12, 35)
+            await ws66i.apply_scene(scene)
+            statuses = await ws66i.zone_statuses([11, 12])
+            await ws66i.close()
+
+        self.assertEqual(list(scene.statuses), statuses)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import unittest
+from unittest import TestCase, mock
+import os
+import socket
+import threading
+
+from pyws66i import get_ws66i, codec, SocketTransport, TelnetTransport, WS66iEmulator
+from pyws66i import transport
+
+
+class TestSocketTransport(TestCase):
+    def setUp(self):
+        self.server = socket.socket()
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(1)
+        self.transport = SocketTransport()
+        self.transport.open("127.0.0.1", self.server.getsockname()[1], 1)
+        self.conn, _ = self.server.accept()
+
+
+    def tearDown(self):
+        self.transport.close()
+        self.conn.close()
+        self.server.close()
+
+
+    def test_write(self):
+        self.assertTrue(self.transport.is_open())
+        self.transport.write(b"?11\r")
+        self.assertEqual(b"?11\r", self.conn.recv(100))
+
+
+    def test_read_line(self):
+        # ----------- test lines are split -----------
+        self.conn.sendall(b"#\r\n#>1100010000131112100401\r\r\n#")
+        self.assertEqual(b"#\r\n", self.transport.read_line(1))
+        self.assertEqual(b"#>1100010000131112100401\r\r\n", self.transport.read_line(1))
+
+        # ----------- test partial line is kept on timeout -----------
+        self.assertEqual(b"", self.transport.read_line(0.01))
+        self.conn.sendall(b">12")
+        self.assertEqual(b"", self.transport.read_line(0.01))
+        self.conn.sendall(b"00\r\n")
+        self.assertEqual(b"#>1200\r\n", self.transport.read_line(1))
+
+
+    def test_buffer_bound(self):
+        self.conn.sendall(b"x" * (3 * transport.BUFFER_SIZE))
+        self.assertEqual(b"", self.transport.read_line(0.05))
+        self.conn.sendall(b"\n")
+        self.assertEqual(transport.BUFFER_SIZE + 1, len(self.transport.read_line(1)))
+
+
+    def test_expect(self):
+        # ----------- test earlier lines are skipped -----------
+        self.conn.sendall(b"#>1100010000131112100401\r\r\n#>1200010000201112100401\r\r\n#")
+        match = self.transport.expect(codec.zone_pattern(12), 1)
+        self.assertEqual(b"1200010000201112100401", match.group(0))
+
+        # ----------- test timeout -----------
+        self.assertIsNone(self.transport.expect(codec.zone_pattern(12), 0.01))
+
+
+    def test_eof(self):
+        self.conn.close()
+        self.assertRaises(EOFError, self.transport.read_line, 1)
+
+
+    def test_close(self):
+        self.transport.close()
+        self.assertFalse(self.transport.is_open())
+        self.assertRaises(BrokenPipeError, self.transport.write, b"?11\r")
+        self.assertRaises(EOFError, self.transport.read_line, 1)
+        self.transport.close()
+
+
+    def test_bad_open(self):
+        self.assertRaises(OSError, SocketTransport().open, "127.0.0.1", 1, 1)
+
+
+    def test_high_file_descriptor(self):
+        # setup, select.select() can't wait on file descriptors above 1023
+        fds = []
+        self.addCleanup(lambda: [os.close(fd) for fd in fds])
+        try:
+            while not fds or fds[-1] < 1100:
+                fds.append(os.open(os.devnull, os.O_RDONLY))
+        except OSError:
+            self.skipTest("Not enough file descriptors available")
+
+        # call
+        with WS66iEmulator() as emulator:
+            ws66i = get_ws66i(emulator.host_name, emulator.host_port)
+            ws66i.open()
+            status = ws66i.zone_status(11)
+            ws66i.close()
+
+        # check
+        self.assertEqual(11, status.zone)
+
+
+class TestTelnetTransport(TestCase):
+    def test_telnetlib_missing(self):
+        with mock.patch('pyws66i.transport.Telnet', None):
+            self.assertRaises(RuntimeError, TelnetTransport)
+
+
+class TestWs66iSocket(TestCase):
+    def setUp(self):
+        self.server = socket.socket()
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(1)
+
+        # Answer zone status requests like the WS66i would
+        def serve():
+            conn, _ = self.server.accept()
+            with conn:
+                while True:
+                    request = conn.recv(100)
+                    if not request:
+                        return
+                    for zone in request.split(b"\r")[:-1]:
+                        if zone.startswith(b"?"):
+                            conn.sendall(b"#>" + zone[1:] + b"00010000131112100401\r\r\n#")
+
+        self.thread = threading.Thread(target=serve, daemon=True)
+        self.thread.start()
+        self.ws66i = get_ws66i("127.0.0.1", self.server.getsockname()[1])
+
+
+    def tearDown(self):
+        self.ws66i.close()
+        self.thread.join(timeout=1)
+        self.server.close()
+
+
+    def test_zone_status(self):
+        self.ws66i.open()
+        self.assertEqual(13, self.ws66i.zone_status(11).volume)
+        self.assertEqual([12, 21], [status.zone for status in self.ws66i.zone_statuses([12, 21])])
+
+
+if __name__ == "__main__":
+    unittest.main()
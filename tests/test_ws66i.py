@@ -1,9 +1,14 @@
 import unittest
 from unittest import TestCase, mock
+import asyncio
+import queue
 import re
 import socket
+import threading
 
-from pyws66i import get_ws66i, ZoneStatus, TIMEOUT
+from pyws66i import get_ws66i, get_async_ws66i, CircuitBreaker, RttEstimator, TelnetTransport, ZoneStatus, TIMEOUT
+from pyws66i import STATE_CLOSED, STATE_OPEN
+from pyws66i import Metrics, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, STARVATION_LIMIT
 
 
 class TestZoneStatus(TestCase):
@@ -11,12 +16,50 @@ class TestZoneStatus(TestCase):
         self.assertIsNone(ZoneStatus.from_string(None))
 
 
+    def test_immutable(self):
+        # setup
+        status = ZoneStatus(11, 0, 1, 0, 0, 13, 11, 12, 10, 4, 1)
+
+        # check
+        self.assertTrue(status.power)
+        self.assertIs(False, status.pa)
+        with self.assertRaises(AttributeError):
+            status.volume = 20
+        self.assertFalse(hasattr(status, '__dict__'))
+        self.assertEqual(20, status._replace(volume=20).volume)
+        self.assertEqual(13, status.volume)
+        self.assertIn('volume:         13', str(status))
+
+
+    def test_equality(self):
+        # setup
+        status = ZoneStatus(11, 0, 1, 0, 0, 13, 11, 12, 10, 4, 1)
+        same = ZoneStatus(11, False, True, False, False, 13, 11, 12, 10, 4, True)
+        other = ZoneStatus(11, 0, 1, 0, 0, 14, 11, 12, 10, 4, 1)
+
+        # check
+        self.assertEqual(status, same)
+        self.assertEqual(hash(status), hash(same))
+        self.assertNotEqual(status, other)
+        self.assertEqual(2, len({status, same, other}))
+
+
+    def test_diff(self):
+        # setup
+        status = ZoneStatus(11, 0, 1, 0, 0, 13, 11, 12, 10, 4, 1)
+
+        # check
+        self.assertEqual({}, status.diff(status))
+        self.assertEqual({'power': False, 'volume': 20, 'source': 2},
+                         status.diff(status._replace(power=False, volume=20, source=2)))
+
+
 class TestWs66i(TestCase):
     def setUp(self):
-        self.patcher = mock.patch('pyws66i.Telnet')
+        self.patcher = mock.patch('pyws66i.transport.Telnet')
         self.mock_telnet = self.patcher.start()
         self.telnet_instance = self.mock_telnet.return_value
-        self.ws66i = get_ws66i("168.192.1.123")
+        self.ws66i = get_ws66i("168.192.1.123", transport=TelnetTransport())
         self.ws66i.open()
         self.telnet_instance.open.assert_called_once()
 
@@ -69,7 +112,7 @@ class TestWs66i(TestCase):
 
         # check
         self.telnet_instance.write.assert_called_with(expected_write)
-        self.telnet_instance.expect.assert_called_with([expected_pattern_coded], timeout=TIMEOUT)
+        self.telnet_instance.expect.assert_called_with([re.compile(expected_pattern_coded)], timeout=TIMEOUT)
         self.assertEqual(zone, status.zone)
         self.assertFalse(status.pa)
         self.assertTrue(status.power)
@@ -99,7 +142,7 @@ class TestWs66i(TestCase):
         # check
         self.telnet_instance.get_socket.assert_called()
         self.telnet_instance.write.assert_called()
-        self.telnet_instance.expect.assert_called_with([expected_pattern_coded], timeout=TIMEOUT)
+        self.telnet_instance.expect.assert_called_with([re.compile(expected_pattern_coded)], timeout=TIMEOUT)
         self.telnet_instance.close.assert_called_once()
         self.assertIsNone(status)
 
@@ -234,6 +277,101 @@ class TestWs66i(TestCase):
         self.assertIsNone(status)
 
 
+    def test_controller_status(self):
+        # ----------- Test good format -----------
+        # setup
+        controller = 2
+        lines = [f"{zone}00010000{zone - 10:02}1112100401".encode() for zone in range(21, 27)]
+        patterns = [f"({zone})(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)".encode()
+                    for zone in range(21, 27)]
+
+        # call
+        self.telnet_instance.expect.side_effect = [
+            [None, re.search(pattern, line), None] for pattern, line in zip(patterns, lines)
+        ]
+        statuses = self.ws66i.controller_status(controller)
+
+        # check
+        self.telnet_instance.write.assert_called_once_with(b'?20\r')
+        self.assertEqual([mock.call([re.compile(pattern)], timeout=TIMEOUT) for pattern in patterns],
+                         self.telnet_instance.expect.call_args_list)
+        self.assertEqual(list(range(21, 27)), [status.zone for status in statuses])
+        self.assertEqual(list(range(11, 17)), [status.volume for status in statuses])
+
+        # ----------- test a missing zone fails the whole request -----------
+        # Clear Mock
+        self.telnet_instance.reset_mock()
+
+        # call
+        self.telnet_instance.expect.side_effect = [
+            [None, re.search(patterns[0], lines[0]), None], [-1, None, b""]
+        ]
+        statuses = self.ws66i.controller_status(controller)
+
+        # check
+        self.assertEqual(2, self.telnet_instance.expect.call_count)
+        self.telnet_instance.close.assert_called_once()
+        self.assertIsNone(statuses)
+
+        # ----------- test expect raises EOFError -----------
+        # Clear Mock
+        self.telnet_instance.reset_mock()
+
+        # call
+        self.telnet_instance.expect.side_effect = EOFError()
+        statuses = self.ws66i.controller_status(controller)
+
+        # check
+        self.telnet_instance.close.assert_called_once()
+        self.assertIsNone(statuses)
+
+        # ----------- test with closed connection -----------
+        # Clear Mock
+        self.telnet_instance.reset_mock()
+
+        # call
+        self.ws66i.close()
+        statuses = self.ws66i.controller_status(controller)
+
+        # check
+        self.telnet_instance.write.assert_not_called()
+        self.assertIsNone(statuses)
+
+
+    def test_zone_statuses(self):
+        # ----------- Test good format -----------
+        # setup
+        zones = [21, 12, 21, 35]
+        patterns = {zone: f"({zone})(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)".encode()
+                    for zone in zones}
+        lines = {zone: f"{zone}00010000{zone - 10:02}1112100401".encode() for zone in zones}
+
+        # call
+        self.telnet_instance.expect.side_effect = [
+            [None, re.search(patterns[zone], lines[zone]), None] for zone in (21, 12, 35)
+        ]
+        statuses = self.ws66i.zone_statuses(zones)
+
+        # check
+        self.telnet_instance.write.assert_called_once_with(b'?21\r?12\r?35\r')
+        self.assertEqual([mock.call([re.compile(patterns[zone])], timeout=TIMEOUT) for zone in (21, 12, 35)],
+                         self.telnet_instance.expect.call_args_list)
+        self.assertEqual(zones, [status.zone for status in statuses])
+        self.assertEqual([11, 2, 11, 25], [status.volume for status in statuses])
+
+        # ----------- test a missing zone fails the whole request -----------
+        # Clear Mock
+        self.telnet_instance.reset_mock()
+
+        # call
+        self.telnet_instance.expect.side_effect = [[-1, None, b""]]
+        statuses = self.ws66i.zone_statuses(zones)
+
+        # check
+        self.telnet_instance.close.assert_called_once()
+        self.assertIsNone(statuses)
+
+
     def test_set_power(self):
         # ----------- test 2nd arg is True -----------
         # setup
@@ -565,23 +703,1069 @@ class TestWs66i(TestCase):
 
 
     def test_restore_zone(self):
+        # ----------- test only the differences are sent, in one write -----------
         # setup
         expected_zone = 11
         expected_string_coded = "1100010000131112100401".encode()
-        expected_pattern_coded = f"({expected_zone})(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)".encode()
+        current_string_coded = "1100000000201112100301".encode()
+        expected_pattern_coded = f"({expected_zone})(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)".encode()
+        ew_st = f'?{expected_zone}\r'.encode()
         ew_pr = f'<{expected_zone}PR01\r'.encode()
-        ew_mu = f'<{expected_zone}MU00\r'.encode()
         ew_vo = f'<{expected_zone}VO13\r'.encode()
-        ew_tr = f'<{expected_zone}TR11\r'.encode()
-        ew_bs = f'<{expected_zone}BS12\r'.encode()
-        ew_bl = f'<{expected_zone}BL10\r'.encode()
         ew_ch = f'<{expected_zone}CH04\r'.encode()
-        expected_list = [mock.call(ew_pr), mock.call(ew_mu), mock.call(ew_vo), mock.call(ew_tr), mock.call(ew_bs), mock.call(ew_bl), mock.call(ew_ch)]
+        expected_list = [mock.call(ew_st), mock.call(ew_pr + ew_vo + ew_ch)]
 
         # call and check
         zone_status = ZoneStatus.from_string(re.search(expected_pattern_coded, expected_string_coded))
+        self.telnet_instance.expect.return_value = [None, re.search(expected_pattern_coded, current_string_coded), None]
+        self.ws66i.restore_zone(zone_status)
+        self.assertEqual(expected_list, self.telnet_instance.write.call_args_list)
+
+        # ----------- test nothing is sent when the zone already matches -----------
+        # Clear Mock
+        self.telnet_instance.reset_mock()
+
+        # call and check
+        self.telnet_instance.expect.return_value = [None, re.search(expected_pattern_coded, expected_string_coded), None]
+        self.ws66i.restore_zone(zone_status)
+        self.assertEqual([mock.call(ew_st)], self.telnet_instance.write.call_args_list)
+
+        # ----------- test nothing is sent when the zone state is unknown -----------
+        # Clear Mock
+        self.telnet_instance.reset_mock()
+
+        # call and check
+        self.telnet_instance.expect.return_value = [-1, None, b""]
         self.ws66i.restore_zone(zone_status)
-        self.assertTrue(self.telnet_instance.write.call_args_list == expected_list)
+        self.assertEqual([mock.call(ew_st)], self.telnet_instance.write.call_args_list)
+
+
+class TestWs66iCache(TestCase):
+    def setUp(self):
+        self.patcher = mock.patch('pyws66i.transport.Telnet')
+        self.mock_telnet = self.patcher.start()
+        self.telnet_instance = self.mock_telnet.return_value
+        self.ws66i = get_ws66i("168.192.1.123", cache_ttl=5, transport=TelnetTransport())
+        self.ws66i.open()
+
+        zone = 11
+        expected_string_coded = "1100010000131112100401".encode()
+        expected_pattern_coded = f"({zone})(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)".encode()
+        self.telnet_instance.expect.return_value = [None, re.search(expected_pattern_coded, expected_string_coded), None]
+
+
+    def tearDown(self):
+        self.ws66i.close()
+        self.patcher.stop()
+
+
+    def test_zone_status_cached(self):
+        # call
+        with mock.patch('pyws66i.time.monotonic', return_value=100):
+            first = self.ws66i.zone_status(11)
+        with mock.patch('pyws66i.time.monotonic', return_value=104):
+            second = self.ws66i.zone_status(11)
+
+        # check
+        self.telnet_instance.expect.assert_called_once()
+        self.assertEqual(13, second.volume)
+        self.assertEqual(first, second)
+
+        # ----------- test stale entry is queried again -----------
+        with mock.patch('pyws66i.time.monotonic', return_value=106):
+            self.ws66i.zone_status(11)
+        self.assertEqual(2, self.telnet_instance.expect.call_count)
+
+
+    def test_write_through(self):
+        # setup
+        snapshot = self.ws66i.zone_status(11)
+
+        # call
+        self.ws66i.set_volume(11, 100)
+        self.ws66i.set_power(11, False)
+        self.ws66i.set_source(11, 2)
+
+        # check
+        status = self.ws66i.zone_status(11)
+        self.telnet_instance.expect.assert_called_once()
+        self.assertEqual(38, status.volume)
+        self.assertFalse(status.power)
+        self.assertEqual(2, status.source)
+        self.assertEqual(12, status.bass)
+        # Snapshots handed out earlier are not modified
+        self.assertEqual(13, snapshot.volume)
+        self.assertTrue(snapshot.power)
+
+        # ----------- test failed write is not cached -----------
+        self.telnet_instance.write.side_effect = BrokenPipeError()
+        self.ws66i.set_volume(11, 1)
+        self.telnet_instance.write.side_effect = None
+        self.assertEqual(38, self.ws66i.zone_status(11).volume)
+
+
+    def test_zone_statuses_cached(self):
+        # setup
+        self.ws66i.zone_status(11)
+        self.telnet_instance.reset_mock()
+        pattern = f"(12)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)(\\d\\d)".encode()
+        self.telnet_instance.expect.return_value = [None, re.search(pattern, b"1200010000051112100401"), None]
+
+        # call
+        statuses = self.ws66i.zone_statuses([11, 12])
+
+        # check
+        self.telnet_instance.write.assert_called_once_with(b'?12\r')
+        self.assertEqual([13, 5], [status.volume for status in statuses])
+
+
+    def test_restore_zone_cached(self):
+        # setup
+        snapshot = self.ws66i.zone_status(11)
+        self.ws66i.set_volume(11, 30)
+        self.ws66i.set_mute(11, True)
+        self.telnet_instance.reset_mock()
+
+        # call
+        self.ws66i.restore_zone(snapshot)
+
+        # check
+        self.telnet_instance.write.assert_called_once_with(b'<11MU00\r<11VO13\r')
+        self.telnet_instance.expect.assert_not_called()
+        self.assertEqual(snapshot.volume, self.ws66i.zone_status(11).volume)
+        self.assertFalse(self.ws66i.zone_status(11).mute)
+
+
+    def test_cache_cleared_on_close(self):
+        # setup
+        self.ws66i.zone_status(11)
+
+        # call
+        self.ws66i.close()
+
+        # check
+        self.assertIsNone(self.ws66i.zone_status(11))
+        self.ws66i.open()
+        self.ws66i.zone_status(11)
+        self.assertEqual(2, self.telnet_instance.expect.call_count)
+
+
+class TestWs66iCoalesce(TestCase):
+    def setUp(self):
+        self.patcher = mock.patch('pyws66i.transport.Telnet')
+        self.mock_telnet = self.patcher.start()
+        self.telnet_instance = self.mock_telnet.return_value
+        self.ws66i = get_ws66i("168.192.1.123", coalesce_window=0.05, transport=TelnetTransport())
+        self.ws66i.open()
+
+
+    def tearDown(self):
+        self.ws66i.close()
+        self.patcher.stop()
+
+
+    def test_coalesce(self):
+        # setup
+        written = threading.Event()
+        self.telnet_instance.write.side_effect = lambda request: written.set()
+
+        # call
+        for volume in range(20):
+            self.ws66i.set_volume(11, volume)
+        self.ws66i.set_bass(12, 3)
+        self.ws66i.set_bass(12, 4)
+        self.ws66i.set_treble(11, 5)
+        self.ws66i.set_balance(11, 6)
+
+        # check
+        self.telnet_instance.write.assert_not_called()
+        self.assertTrue(written.wait(timeout=1))
+        self.telnet_instance.write.assert_called_once_with(b'<11VO19\r<12BS04\r<11TR05\r<11BL06\r')
+
+        # ----------- test a new window starts after a flush -----------
+        written.clear()
+        self.ws66i.set_volume(11, 1)
+        self.assertTrue(written.wait(timeout=1))
+        self.telnet_instance.write.assert_called_with(b'<11VO01\r')
+
+
+    def test_other_setters_not_coalesced(self):
+        # call
+        self.ws66i.set_power(11, True)
+        self.ws66i.set_mute(11, True)
+        self.ws66i.set_source(11, 2)
+
+        # check
+        self.assertEqual([mock.call(b'<11PR01\r'), mock.call(b'<11MU01\r'), mock.call(b'<11CH02\r')],
+                         self.telnet_instance.write.call_args_list)
+
+
+    def test_flush(self):
+        # ----------- test explicit flush -----------
+        self.ws66i.set_volume(11, 10)
+        self.ws66i.flush()
+        self.telnet_instance.write.assert_called_once_with(b'<11VO10\r')
+
+        # ----------- test restore_zone sends pending values first -----------
+        self.telnet_instance.reset_mock()
+        self.telnet_instance.expect.return_value = [-1, None, b""]
+        self.ws66i.set_volume(11, 20)
+        self.ws66i.restore_zone(ZoneStatus(11, 0, 1, 0, 0, 13, 11, 12, 10, 4, 1))
+        self.assertEqual(mock.call(b'<11VO20\r'), self.telnet_instance.write.call_args_list[0])
+
+        # ----------- test close sends pending values -----------
+        self.telnet_instance.reset_mock()
+        self.ws66i.set_volume(11, 30)
+        self.ws66i.close()
+        self.telnet_instance.write.assert_called_once_with(b'<11VO30\r')
+
+
+class TestWs66iFade(TestCase):
+    def setUp(self):
+        self.patcher = mock.patch('pyws66i.transport.Telnet')
+        self.mock_telnet = self.patcher.start()
+        self.telnet_instance = self.mock_telnet.return_value
+        self.interval_patcher = mock.patch('pyws66i.FADE_INTERVAL', 0.01)
+        self.interval_patcher.start()
+        self.ws66i = get_ws66i("168.192.1.123", transport=TelnetTransport())
+        self.ws66i.open()
+
+
+    def tearDown(self):
+        self.ws66i.close()
+        self.interval_patcher.stop()
+        self.patcher.stop()
+
+
+    def expect_volumes(self, volumes):
+        self.telnet_instance.expect.side_effect = [
+            [None, re.search(rb"(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)",
+                             f"{zone}00010000{volume:02}1112100401".encode()), None]
+            for zone, volume in volumes
+        ]
+
+
+    def test_fade_volume(self):
+        # setup
+        self.expect_volumes([(11, 0), (12, 20)])
+
+        # call
+        done = self.ws66i.fade_volume([11, 12], 10, 0.1)
+
+        # check
+        self.assertTrue(done.wait(timeout=2))
+        writes = [c.args[0] for c in self.telnet_instance.write.call_args_list]
+        self.assertEqual(b'?11\r?12\r', writes[0])
+        self.assertEqual(b'<11VO10\r<12VO10\r', writes[-1])
+        for write in writes[1:]:
+            # Both zones step in the same write and move towards the target
+            zone_11, zone_12 = (int(m) for m in re.findall(rb"VO(\d\d)", write))
+            self.assertTrue(0 < zone_11 <= 10 <= zone_12 < 20)
+
+
+    def test_set_volume_cancels_fade(self):
+        # setup
+        self.expect_volumes([(11, 0), (12, 0)])
+        done = self.ws66i.fade_volume([11, 12], 30, 5)
+
+        # call
+        self.ws66i.set_volume(11, 1)
+        self.assertFalse(done.is_set())
+        self.ws66i.cancel_fade()
+
+        # check
+        self.assertTrue(done.is_set())
+        self.telnet_instance.write.assert_any_call(b'<11VO01\r')
+
+
+    def test_fade_unknown_zones(self):
+        # setup
+        self.telnet_instance.expect.return_value = [-1, None, b""]
+
+        # call and check
+        done = self.ws66i.fade_volume([11], 30, 5)
+        self.assertTrue(done.is_set())
+
+
+class TestWs66iBreaker(TestCase):
+    def setUp(self):
+        self.patcher = mock.patch('pyws66i.transport.Telnet')
+        self.mock_telnet = self.patcher.start()
+        self.telnet_instance = self.mock_telnet.return_value
+        self.breaker = CircuitBreaker(initial_delay=0.01, max_delay=0.02)
+        self.states = queue.Queue()
+        self.breaker.add_listener(self.states.put)
+        self.ws66i = get_ws66i("168.192.1.123", transport=TelnetTransport(), breaker=self.breaker)
+        self.ws66i.open()
+        self.telnet_instance.reset_mock()
+
+
+    def tearDown(self):
+        self.ws66i.close()
+        self.patcher.stop()
+
+
+    def test_fail_fast(self):
+        # setup
+        probed = threading.Event()
+        self.addCleanup(probed.set)
+        self.telnet_instance.expect.return_value = [-1, None, b""]
+        self.telnet_instance.open.side_effect = lambda *args: probed.wait()
+
+        # call
+        self.assertIsNone(self.ws66i.zone_status(11))
+
+        # check
+        self.assertFalse(self.breaker.allow())
+        self.telnet_instance.get_socket.return_value = None
+        self.telnet_instance.reset_mock()
+        self.assertIsNone(self.ws66i.zone_status(12))
+        self.assertIsNone(self.ws66i.zone_statuses([11, 12]))
+        self.assertIsNone(self.ws66i.controller_status(1))
+        self.ws66i.set_volume(11, 10)
+        self.assertRaises(ConnectionError, self.ws66i.open)
+        self.telnet_instance.write.assert_not_called()
+
+
+    def test_probe_reconnects(self):
+        # setup
+        self.telnet_instance.expect.return_value = [-1, None, b""]
+        self.telnet_instance.get_socket.return_value = None
+        self.telnet_instance.open.side_effect = [OSError(), OSError(), None]
+
+        # call
+        self.assertIsNone(self.ws66i.zone_status(11))
+
+        # check
+        self.assertEqual(STATE_OPEN, self.states.get(timeout=1))
+        while self.states.get(timeout=1) != STATE_CLOSED:
+            pass
+        self.assertEqual(3, self.telnet_instance.open.call_count)
+        self.telnet_instance.get_socket.return_value = mock.MagicMock()
+        self.ws66i.set_volume(11, 10)
+        self.telnet_instance.write.assert_called_with(b'<11VO10\r')
+
+
+    def test_close_stops_probe(self):
+        # setup
+        self.telnet_instance.expect.return_value = [-1, None, b""]
+        self.telnet_instance.open.side_effect = OSError()
+        self.ws66i.zone_status(11)
+
+        # call
+        self.ws66i.close()
+
+        # check
+        self.assertFalse(any(thread.name == "ws66i-probe" for thread in threading.enumerate()))
+        self.assertEqual(STATE_CLOSED, self.breaker.state)
+
+
+class TestWs66iTimeout(TestCase):
+    def setUp(self):
+        self.patcher = mock.patch('pyws66i.transport.Telnet')
+        self.mock_telnet = self.patcher.start()
+        self.telnet_instance = self.mock_telnet.return_value
+        self.rtt = RttEstimator(initial_timeout=0.8, min_timeout=0.1, max_timeout=2.0)
+        self.ws66i = get_ws66i("168.192.1.123", transport=TelnetTransport(), rtt_estimator=self.rtt)
+        self.ws66i.open()
+        self.pattern = rb"(11)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)"
+        self.telnet_instance.expect.return_value = [
+            None, re.search(self.pattern, b"1100010000131112100401"), None
+        ]
+
+
+    def tearDown(self):
+        self.ws66i.close()
+        self.patcher.stop()
+
+
+    def test_adaptive_timeout(self):
+        # ----------- test initial timeout until a reply is measured -----------
+        self.ws66i.zone_status(11)
+        self.telnet_instance.expect.assert_called_with([re.compile(self.pattern)], timeout=0.8)
+        self.assertIsNotNone(self.rtt.srtt)
+
+        # ----------- test timeout follows the measured round trips -----------
+        self.ws66i.zone_status(11)
+        self.telnet_instance.expect.assert_called_with([re.compile(self.pattern)], timeout=0.1)
+
+        # ----------- test lost reply backs off -----------
+        self.telnet_instance.expect.return_value = [-1, None, b""]
+        self.assertIsNone(self.ws66i.zone_status(11))
+        self.assertAlmostEqual(0.2, self.rtt.timeout())
+
+
+    def test_zone_status_timeout(self):
+        # call
+        self.ws66i.zone_status(11, timeout=0.3)
+
+        # check
+        self.telnet_instance.expect.assert_called_with([re.compile(self.pattern)], timeout=0.3)
+
+        # ----------- test lost reply with a timeout doesn't back off -----------
+        timeout = self.rtt.timeout()
+        self.telnet_instance.expect.return_value = [-1, None, b""]
+        self.assertIsNone(self.ws66i.zone_status(11, timeout=0.3))
+        self.assertEqual(timeout, self.rtt.timeout())
+
+
+    def test_setter_timeout(self):
+        # setup
+        busy = threading.Event()
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def zone_status_blocks(*args, **kwargs):
+            busy.set()
+            release.wait()
+            return [-1, None, b""]
+
+        self.telnet_instance.expect.side_effect = zone_status_blocks
+        thread = threading.Thread(target=self.ws66i.zone_status, args=(12,))
+        thread.start()
+        busy.wait(1)
+        self.telnet_instance.write.reset_mock()
+
+        # ----------- test setter gives up while a request is in flight -----------
+        self.ws66i.set_power(11, True, timeout=0.05)
+        self.ws66i.set_volume(11, 10, timeout=0.05)
+        self.telnet_instance.write.assert_not_called()
+
+        # ----------- test setter is sent once the connection is free -----------
+        release.set()
+        thread.join()
+        self.ws66i.set_power(11, True, timeout=0.05)
+        self.telnet_instance.write.assert_called_with(b"<11PR01\r")
+
+
+class TestWs66iTopology(TestCase):
+    def setUp(self):
+        self.patcher = mock.patch('pyws66i.transport.Telnet')
+        self.mock_telnet = self.patcher.start()
+        self.telnet_instance = self.mock_telnet.return_value
+        # Only the main amp and the second expander reply
+        self.telnet_instance.expect.side_effect = self.reply
+        self.ws66i = get_ws66i("168.192.1.123", transport=TelnetTransport())
+        self.ws66i.open()
+
+
+    def tearDown(self):
+        self.ws66i.close()
+        self.patcher.stop()
+
+
+    @staticmethod
+    def reply(patterns, timeout):
+        zone = int(patterns[0].pattern[1:3])
+        if zone // 10 == 2:
+            return [-1, None, b""]
+        return [0, patterns[0].search(b"%d00010000131112100401" % zone), None]
+
+
+    def test_probe_topology(self):
+        # ----------- test unknown topology polls every zone -----------
+        self.assertIsNone(self.ws66i.topology())
+
+        # call
+        self.assertEqual([1, 3], self.ws66i.probe_topology(timeout=0.01))
+
+        # check
+        self.assertEqual([1, 3], self.ws66i.topology())
+        self.assertEqual(
+            [mock.call(b"?10\r"), mock.call(b"?20\r"), mock.call(b"?30\r")],
+            self.telnet_instance.write.call_args_list,
+        )
+
+        # ----------- test absent zones are skipped -----------
+        self.telnet_instance.reset_mock()
+        self.assertIsNone(self.ws66i.zone_status(21))
+        self.assertIsNone(self.ws66i.controller_status(2))
+        statuses = self.ws66i.zone_statuses([11, 21, 31])
+        self.assertEqual([11, 31], [status.zone for status in statuses])
+        self.telnet_instance.write.assert_called_once_with(b"?11\r?31\r")
+
+
+    def test_main_amp_off(self):
+        # setup
+        self.telnet_instance.expect.side_effect = None
+        self.telnet_instance.expect.return_value = [-1, None, b""]
+
+        # call
+        self.assertIsNone(self.ws66i.probe_topology())
+
+        # check
+        self.assertIsNone(self.ws66i.topology())
+        self.telnet_instance.write.assert_called_once_with(b"?10\r")
+
+
+    def test_persisted_topology(self):
+        # call
+        ws66i = get_ws66i("168.192.1.123", transport=TelnetTransport(), topology=[1])
+        ws66i.open()
+        self.addCleanup(ws66i.close)
+
+        # check
+        self.assertEqual([1], ws66i.topology())
+        self.assertIsNone(ws66i.zone_status(31))
+        self.telnet_instance.write.assert_not_called()
+
+
+class TestWs66iWorker(TestCase):
+    def setUp(self):
+        self.patcher = mock.patch('pyws66i.transport.Telnet')
+        self.mock_telnet = self.patcher.start()
+        self.telnet_instance = self.mock_telnet.return_value
+        self.ws66i = get_ws66i("168.192.1.123", transport=TelnetTransport())
+        self.ws66i.open()
+
+
+    def tearDown(self):
+        self.ws66i.close()
+        self.patcher.stop()
+
+
+    def test_submit(self):
+        # setup
+        writers = []
+        self.telnet_instance.write.side_effect = lambda data: writers.append(threading.current_thread().name)
+        pattern = rb"(11)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)"
+        self.telnet_instance.expect.return_value = [0, re.search(pattern, b"1100010000131112100401"), None]
+
+        # call
+        status = self.ws66i.submit(self.ws66i.zone_status, 11)
+        setter = self.ws66i.submit(self.ws66i.set_volume, 11, 20)
+
+        # check
+        self.assertEqual(11, status.result(timeout=1).zone)
+        self.assertIsNone(setter.result(timeout=1))
+        self.assertEqual(["ws66i-io", "ws66i-io"], writers)
+
+
+    def test_caller_not_blocked(self):
+        # setup
+        release = threading.Event()
+        self.addCleanup(release.set)
+        waiting = threading.Event()
+
+        def expect_blocks(*args, **kwargs):
+            waiting.set()
+            release.wait()
+            return [-1, None, b""]
+
+        self.telnet_instance.expect.side_effect = expect_blocks
+
+        # call
+        status = self.ws66i.submit(self.ws66i.zone_status, 11)
+        self.assertTrue(waiting.wait(1))
+        setter = self.ws66i.submit(self.ws66i.set_power, 11, True)
+
+        # check
+        self.assertFalse(status.done())
+        self.assertFalse(setter.done())
+        release.set()
+        self.assertIsNone(status.result(timeout=1))
+        setter.result(timeout=1)
+        self.telnet_instance.write.assert_called_with(b"<11PR01\r")
+
+
+    def test_priority(self):
+        # setup
+        release = threading.Event()
+        self.addCleanup(release.set)
+        blocker = self.ws66i.submit(release.wait)
+        order = []
+        pattern = rb"(11)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)"
+        self.telnet_instance.write.side_effect = order.append
+        self.telnet_instance.expect.return_value = [0, re.search(pattern, b"1100010000131112100401"), None]
+
+        # call
+        status = self.ws66i.submit(self.ws66i.zone_status, 11)
+        setter = self.ws66i.submit(self.ws66i.set_mute, 11, True)
+        release.set()
+
+        # check
+        blocker.result(timeout=1)
+        status.result(timeout=1)
+        setter.result(timeout=1)
+        self.assertEqual([b"<11MU01\r", b"?11\r"], order)
+
+
+    def test_starvation(self):
+        # setup
+        release = threading.Event()
+        self.addCleanup(release.set)
+        running = threading.Event()
+
+        def block():
+            running.set()
+            release.wait()
+
+        self.ws66i.submit(block)
+        self.assertTrue(running.wait(1))
+        order = []
+
+        # call
+        futures = [self.ws66i.submit(order.append, "poll", priority=PRIORITY_BACKGROUND)]
+        futures += [self.ws66i.submit(order.append, index) for index in range(STARVATION_LIMIT + 2)]
+        release.set()
+
+        # check
+        for future in futures:
+            future.result(timeout=1)
+        self.assertEqual(list(range(STARVATION_LIMIT)) + ["poll", STARVATION_LIMIT, STARVATION_LIMIT + 1], order)
+
+
+    def test_queue_wait_metrics(self):
+        # setup
+        metrics = Metrics()
+        ws66i = get_ws66i("168.192.1.123", transport=TelnetTransport(), metrics=metrics)
+        self.addCleanup(ws66i.close)
+        self.telnet_instance.expect.return_value = [-1, None, b""]
+
+        # call
+        ws66i.open()
+        ws66i.set_power(11, True)
+        ws66i.zone_status(11, timeout=0.01)
+
+        # check
+        queue_wait = metrics.snapshot()["queue_wait"]
+        self.assertEqual(2, queue_wait[PRIORITY_INTERACTIVE]["count"])
+        self.assertEqual(1, queue_wait[PRIORITY_BACKGROUND]["count"])
+
+
+    def test_exception(self):
+        def fail():
+            raise ValueError()
+
+        self.assertRaises(ValueError, self.ws66i.submit(fail).result, 1)
+
+
+    def test_close_stops_worker(self):
+        # call
+        self.ws66i.close()
+
+        # check
+        self.assertFalse(any(thread.name == "ws66i-io" for thread in threading.enumerate()))
+
+
+class TestWs66iBatch(TestCase):
+    def setUp(self):
+        self.patcher = mock.patch('pyws66i.transport.Telnet')
+        self.mock_telnet = self.patcher.start()
+        self.telnet_instance = self.mock_telnet.return_value
+        self.ws66i = get_ws66i("168.192.1.123", transport=TelnetTransport(), coalesce_window=10)
+        self.ws66i.open()
+
+
+    def tearDown(self):
+        self.ws66i.close()
+        self.patcher.stop()
+
+
+    def test_batch(self):
+        # call
+        with self.ws66i.batch():
+            self.ws66i.set_volume(11, 10)
+            self.ws66i.set_mute(11, True)
+            with self.ws66i.batch():
+                self.ws66i.set_power(12, True)
+            self.ws66i.set_volume(11, 20)
+            self.telnet_instance.write.assert_not_called()
+
+        # check
+        self.telnet_instance.write.assert_called_once_with(b"<11VO20\r<11MU01\r<12PR01\r")
+
+
+    def test_batch_overrides_coalesced(self):
+        # setup
+        self.ws66i.set_volume(11, 5)
+
+        # call
+        with self.ws66i.batch():
+            self.ws66i.set_volume(11, 10)
+        self.ws66i.flush()
+
+        # check
+        self.telnet_instance.write.assert_called_once_with(b"<11VO10\r")
+
+
+    def test_batch_discarded_on_error(self):
+        with self.assertRaises(ValueError):
+            with self.ws66i.batch():
+                self.ws66i.set_power(11, True)
+                raise ValueError()
+
+        self.telnet_instance.write.assert_not_called()
+        self.ws66i.set_power(11, True)
+        self.telnet_instance.write.assert_called_once_with(b"<11PR01\r")
+
+
+    def test_other_threads_not_batched(self):
+        with self.ws66i.batch():
+            thread = threading.Thread(target=self.ws66i.set_power, args=(12, True))
+            thread.start()
+            thread.join()
+            self.ws66i.set_power(11, True)
+            self.telnet_instance.write.assert_called_once_with(b"<12PR01\r")
+
+        self.telnet_instance.write.assert_called_with(b"<11PR01\r")
+
+
+class TestWs66iListener(TestCase):
+    def setUp(self):
+        self.patcher = mock.patch('pyws66i.transport.Telnet')
+        self.mock_telnet = self.patcher.start()
+        self.telnet_instance = self.mock_telnet.return_value
+        self.received = queue.Queue()
+
+        # Emulate the amp: replies to status requests are read back line by line
+        def read_until(match, timeout):
+            try:
+                return self.received.get(timeout=timeout)
+            except queue.Empty:
+                return b""
+
+        def write(request):
+            if request.startswith(b'?'):
+                zone = int(request[1:3])
+                zones = range(zone + 1, zone + 7) if zone % 10 == 0 else [zone]
+                for zone in zones:
+                    self.received.put(f"#>{zone}00010000131112100401\r\r\n".encode())
+
+        self.telnet_instance.read_until.side_effect = read_until
+        self.telnet_instance.write.side_effect = write
+        self.ws66i = get_ws66i("168.192.1.123", transport=TelnetTransport())
+        self.ws66i.open()
+
+
+    def tearDown(self):
+        self.ws66i.close()
+        self.patcher.stop()
+
+
+    def test_unsolicited_update(self):
+        # setup
+        updates = queue.Queue()
+        self.ws66i.subscribe(updates.put)
+
+        # call
+        self.received.put(b"#>1200010000")
+        self.received.put(b"201112100401\r\r\n#")
+
+        # check
+        status = updates.get(timeout=1)
+        self.assertEqual(12, status.zone)
+        self.assertEqual(20, status.volume)
+        self.telnet_instance.expect.assert_not_called()
+
+
+    def test_zone_status_while_listening(self):
+        # setup
+        updates = queue.Queue()
+        self.ws66i.subscribe(updates.put)
+
+        # call
+        status = self.ws66i.zone_status(13)
+        statuses = self.ws66i.controller_status(1)
+
+        # check
+        self.assertEqual(13, status.zone)
+        self.assertEqual(13, status.volume)
+        self.assertEqual(list(range(11, 17)), [status.zone for status in statuses])
+        self.telnet_instance.expect.assert_not_called()
+        self.assertEqual(13, updates.get(timeout=1).zone)
+
+        # ----------- test no reply -----------
+        self.telnet_instance.write.side_effect = None
+        with mock.patch('pyws66i.TIMEOUT', 0.05):
+            status = self.ws66i.zone_status(13)
+        self.assertIsNone(status)
+        self.telnet_instance.close.assert_called_once()
+
+
+    def test_unsubscribe(self):
+        # setup
+        callback = mock.MagicMock()
+        self.ws66i.subscribe(callback)
+        self.assertTrue(any(thread.name == "ws66i-listener" for thread in threading.enumerate()))
+
+        # call
+        self.ws66i.unsubscribe(callback)
+
+        # check
+        self.assertFalse(any(thread.name == "ws66i-listener" for thread in threading.enumerate()))
+        self.telnet_instance.expect.return_value = [-1, None, b""]
+        self.ws66i.zone_status(11)
+        self.telnet_instance.expect.assert_called_once()
+        callback.assert_not_called()
+
+
+    def test_connection_lost(self):
+        # setup
+        self.telnet_instance.read_until.side_effect = EOFError()
+
+        # call
+        self.ws66i.subscribe(mock.MagicMock())
+
+        # check
+        self.ws66i._listener.join(timeout=1)
+        self.telnet_instance.get_socket.return_value = None
+        self.telnet_instance.close.assert_called_once()
+
+        # ----------- test reconnect restarts the listener -----------
+        self.telnet_instance.read_until.side_effect = EOFError()
+        self.telnet_instance.expect.return_value = [-1, None, b""]
+        self.assertIsNone(self.ws66i.zone_status(11))
+        self.assertEqual(2, self.telnet_instance.open.call_count)
+
+
+class TestAsyncWs66i(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.reader = asyncio.StreamReader()
+        self.writer = mock.MagicMock()
+        self.writer.drain = mock.AsyncMock()
+        self.writer.is_closing.return_value = False
+        self.patcher = mock.patch('pyws66i.asyncio.open_connection',
+                                  new=mock.AsyncMock(return_value=(self.reader, self.writer)))
+        self.mock_open_connection = self.patcher.start()
+        self.ws66i = get_async_ws66i("168.192.1.123")
+        await self.ws66i.open()
+        self.mock_open_connection.assert_called_once_with("168.192.1.123", 8080)
+
+
+    async def asyncTearDown(self):
+        await self.ws66i.close()
+        self.patcher.stop()
+
+
+    async def test_bad_open(self):
+        # ----------- test open raises OSError -----------
+        self.mock_open_connection.side_effect = OSError()
+        with self.assertRaises(ConnectionError):
+            await self.ws66i.open()
+
+        # ----------- test open times out -----------
+        self.mock_open_connection.side_effect = asyncio.TimeoutError()
+        with self.assertRaises(ConnectionError):
+            await self.ws66i.open()
+
+
+    async def test_zone_status(self):
+        # ----------- Test good format -----------
+        # setup
+        zone = 11
+        self.reader.feed_data(b"#\r\n#>1100010000131112100401\r\r\n#")
+
+        # call
+        status = await self.ws66i.zone_status(zone)
+
+        # check
+        self.writer.write.assert_called_with(f'?{zone}\r'.encode())
+        self.assertEqual(zone, status.zone)
+        self.assertTrue(status.power)
+        self.assertFalse(status.mute)
+        self.assertEqual(13, status.volume)
+        self.assertEqual(11, status.treble)
+        self.assertEqual(12, status.bass)
+        self.assertEqual(10, status.balance)
+        self.assertEqual(4, status.source)
+        self.assertTrue(status.keypad)
+
+        # ----------- test other zones in the stream are skipped -----------
+        self.reader.feed_data(b"#>1200000000050707100201\r\r\n#>1300010000202020200601\r\r\n#")
+        status = await self.ws66i.zone_status(13)
+        self.assertEqual(13, status.zone)
+        self.assertEqual(20, status.volume)
+
+        # ----------- test no reply times out and closes the stream -----------
+        with mock.patch('pyws66i.TIMEOUT', 0.01):
+            status = await self.ws66i.zone_status(zone)
+        self.assertIsNone(status)
+        self.writer.close.assert_called_once()
+
+        # ----------- test connection re-established, success -----------
+        self.mock_open_connection.reset_mock()
+        self.reader = asyncio.StreamReader()
+        self.mock_open_connection.return_value = (self.reader, self.writer)
+        self.reader.feed_data(b"#>1100010000131112100401\r\r\n#")
+        status = await self.ws66i.zone_status(zone)
+        self.mock_open_connection.assert_called_once()
+        self.assertIsNotNone(status)
+
+        # ----------- test EOF -----------
+        self.reader.feed_eof()
+        status = await self.ws66i.zone_status(zone)
+        self.assertIsNone(status)
+
+        # ----------- test fails open -----------
+        self.mock_open_connection.reset_mock()
+        self.writer.reset_mock()
+        self.mock_open_connection.side_effect = OSError()
+        status = await self.ws66i.zone_status(zone)
+        self.mock_open_connection.assert_called_once()
+        self.writer.write.assert_not_called()
+        self.assertIsNone(status)
+
+        # ----------- test zone_status with closed connection -----------
+        self.mock_open_connection.reset_mock()
+        await self.ws66i.close()
+        status = await self.ws66i.zone_status(zone)
+        self.mock_open_connection.assert_not_called()
+        self.assertIsNone(status)
+
+
+    async def test_controller_status(self):
+        # ----------- Test good format -----------
+        # setup
+        self.reader.feed_data(b"#\r\n" + b"".join(
+            f"#>{zone}00010000{zone - 10:02}1112100401\r\r\n".encode() for zone in range(11, 17)
+        ) + b"#")
+
+        # call
+        statuses = await self.ws66i.controller_status(1)
+
+        # check
+        self.writer.write.assert_called_once_with(b'?10\r')
+        self.assertEqual(list(range(11, 17)), [status.zone for status in statuses])
+        self.assertEqual(list(range(1, 7)), [status.volume for status in statuses])
+
+        # ----------- test a missing zone fails the whole request -----------
+        self.reader.feed_data(b"#>1100010000131112100401\r\r\n#")
+        with mock.patch('pyws66i.TIMEOUT', 0.01):
+            statuses = await self.ws66i.controller_status(1)
+        self.assertIsNone(statuses)
+        self.writer.close.assert_called_once()
+
+
+    async def test_zone_statuses(self):
+        # setup
+        self.reader.feed_data(b"#>1300010000031112100401\r\r\n#"
+                              b"#>1100010000011112100401\r\r\n#")
+
+        # call
+        statuses = await self.ws66i.zone_statuses([11, 13, 11])
+
+        # check
+        self.writer.write.assert_called_once_with(b'?11\r?13\r')
+        self.assertEqual([11, 13, 11], [status.zone for status in statuses])
+        self.assertEqual([1, 3, 1], [status.volume for status in statuses])
+
+
+    async def test_subscribe(self):
+        # setup
+        updates = []
+        await self.ws66i.subscribe(updates.append)
+
+        # call
+        self.reader.feed_data(b"#>1500010000201112100401\r\r\n#")
+        await asyncio.sleep(0)
+        self.reader.feed_data(b"#>1600010000")
+        await asyncio.sleep(0)
+
+        # check
+        self.assertEqual([15], [status.zone for status in updates])
+        self.assertEqual(20, updates[0].volume)
+
+        # ----------- test solicited replies are delivered too -----------
+        self.reader.feed_data(b"211112100401\r\r\n#")
+        await asyncio.sleep(0)
+        self.assertEqual([15, 16], [status.zone for status in updates])
+
+        # ----------- test unsubscribe -----------
+        await self.ws66i.unsubscribe(updates.append)
+        self.reader.feed_data(b"#>1500010000201112100401\r\r\n#")
+        await asyncio.sleep(0)
+        self.assertEqual(2, len(updates))
+
+
+    async def test_setters(self):
+        # call
+        await self.ws66i.set_power(12, True)
+        await self.ws66i.set_mute(13, False)
+        await self.ws66i.set_volume(14, 100)
+        await self.ws66i.set_treble(15, 5)
+        await self.ws66i.set_bass(15, -10)
+        await self.ws66i.set_balance(15, 16)
+        await self.ws66i.set_source(16, 1)
+
+        # check
+        expected_list = [mock.call(b'<12PR01\r'), mock.call(b'<13MU00\r'), mock.call(b'<14VO38\r'),
+                         mock.call(b'<15TR05\r'), mock.call(b'<15BS00\r'), mock.call(b'<15BL16\r'),
+                         mock.call(b'<16CH01\r')]
+        self.assertEqual(expected_list, self.writer.write.call_args_list)
+        self.assertEqual(7, self.writer.drain.await_count)
+
+
+    async def test_timeout(self):
+        # ----------- test zone_status timeout overrides TIMEOUT -----------
+        with mock.patch('pyws66i.TIMEOUT', 10):
+            status = await self.ws66i.zone_status(11, timeout=0.01)
+        self.assertIsNone(status)
+
+        # ----------- test adaptive timeout measures replies -----------
+        rtt = RttEstimator()
+        self.ws66i = get_async_ws66i("168.192.1.123", rtt_estimator=rtt)
+        self.reader = asyncio.StreamReader()
+        self.mock_open_connection.return_value = (self.reader, self.writer)
+        await self.ws66i.open()
+        self.reader.feed_data(b"#>1100010000131112100401\r\r\n#")
+        self.assertIsNotNone(await self.ws66i.zone_status(11))
+        self.assertIsNotNone(rtt.srtt)
+
+
+    async def test_probe_topology(self):
+        # setup
+        self.reader.feed_data(b"".join(b"#>%d00010000131112100401\r\r\n" % zone for zone in range(11, 17)))
+
+        # call
+        self.assertEqual([1], await self.ws66i.probe_topology(timeout=0.01))
+
+        # check
+        self.assertEqual([1], await self.ws66i.topology())
+        self.writer.write.reset_mock()
+        self.assertIsNone(await self.ws66i.zone_status(21))
+        self.assertIsNone(await self.ws66i.controller_status(3))
+        self.writer.write.assert_not_called()
+
+
+    async def test_batch(self):
+        # call
+        async with self.ws66i.batch():
+            await self.ws66i.set_volume(11, 10)
+            await self.ws66i.set_source(12, 3)
+            await self.ws66i.set_volume(11, 20)
+            self.writer.write.assert_not_called()
+
+        # check
+        self.writer.write.assert_called_once_with(b"<11VO20\r<12CH03\r")
+
+        # ----------- test batch discarded on error -----------
+        self.writer.write.reset_mock()
+        with self.assertRaises(ValueError):
+            async with self.ws66i.batch():
+                await self.ws66i.set_power(11, True)
+                raise ValueError()
+        self.writer.write.assert_not_called()
+
+        # ----------- test tasks created in the batch are not collected -----------
+        async with self.ws66i.batch():
+            task = asyncio.ensure_future(self.ws66i.set_volume(11, 3))
+            await self.ws66i.set_mute(12, True)
+        await task
+        self.assertCountEqual(
+            [mock.call(b"<12MU01\r"), mock.call(b"<11VO03\r")], self.writer.write.call_args_list
+        )
+
+
+    async def test_restore_zone(self):
+        # setup
+        zone_status = ZoneStatus(11, 0, 1, 0, 0, 13, 11, 12, 10, 4, 1)
+        self.reader.feed_data(b"#>1100000100131112090401\r\r\n#")
+        expected_list = [mock.call(b'?11\r'), mock.call(b'<11PR01\r<11MU00\r<11BL10\r')]
+
+        # call and check
+        await self.ws66i.restore_zone(zone_status)
+        self.assertEqual(expected_list, self.writer.write.call_args_list)
 
 
 if __name__ == "__main__":